@@ -1,6 +1,4 @@
 import argparse
-import bisect
-import operator
 import os
 
 import media_library as ml
@@ -17,18 +15,6 @@ def get_args() -> argparse.Namespace:
     return args
 
 
-def check_master_files(master: list[ml.Entries], curr: ml.Entries) -> int:
-    entry_size = operator.attrgetter("current_size")
-
-    result = bisect.bisect_left(master, curr.current_size, key=entry_size)
-    while True:
-        if result == len(master) or master[result].current_size != curr.current_size:
-            return -1
-        if master[result].name == curr.name:
-            return result
-        result += 1
-
-
 def main() -> None:
 
     args = get_args()
@@ -50,23 +36,24 @@ def main() -> None:
     else:
         ml.exit_error(f"{backup_path} doesn't exist!")
 
-    change_count = 0
+    master_index = ml.MasterIndex(master)
+    updated = []
     for item in working:
-        result = check_master_files(master, item)
-        if result != -1:
+        found, result = ml.check_name(master_index, item.name, item.current_size)
+        if found:
             inode = item.ino
             item = master[result]
             backup_ptr = ml.make_backup_path_entry(backup_path, inode)
             if backup_ptr not in item.paths:
                 master[result].backups += 1
                 master[result].paths.append(backup_ptr)
-                change_count += 1
+                updated.append(master[result])
                 if args.verbose:
                     print(master[result])
-        else:
+        elif not master_index.find_size_name(item.current_size, item.name):
             print(f"{item.name} not found in master file.")
-    print(f"{change_count} records updated.")
-    ml.write_entries_file(master, master_output_path, args.write_csv)
+    print(f"{len(updated)} records updated.")
+    ml.save_master_changes(master, args.master_input_path, master_output_path, updated, write_csv=args.write_csv)
 
 
 if __name__ == "__main__":
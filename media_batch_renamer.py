@@ -16,37 +16,29 @@ def get_args() -> argparse.Namespace:
     parser.add_argument("-i", type=str, dest="master_input_path", default="master_filelist")
     parser.add_argument("-n", action="store_true", default=False, dest="no_action", help="No action.")
     parser.add_argument("-v", action="store_true", default=False, dest="verbose", help="Verbose.")
+    ml.add_write_hashes_argument(parser)
     args = parser.parse_args()
     return args
 
 
-def path_inode(item: ml.Entries) -> Tuple[bool, int]:
-    for path in item.paths:
-        if path[: path.find("[")] == gb_target_path:
-            return True, int(path[path.find("[") + 1 : path.find("]")])
-    return False, 0
-
-
-def check_master(master: list[ml.Entries], target_item: ml.Entries) -> Tuple[bool, int]:
-    _, result = ml.check_original_size(master, target_item.original_size)
-    while True:
-        if result >= len(master) or master[result].original_size != target_item.original_size:
-            return False, 0
+def check_master(
+    master: list[ml.Entries], by_original_size: ml.SortedView, backups: ml.BackupIndex, target_item: ml.Entries
+) -> Tuple[bool, int]:
+    backup_entry = backups.find(gb_target_path, target_item.ino)
+    target = ml.DuplicateCheck(os.path.join(gb_target_path, target_item.name))
+    for result in by_original_size.equal(target_item.original_size):
         if master[result].name == target_item.name:
             return False, result
-        found, inode = path_inode(master[result])
-        if found and inode == target_item.ino and master[result].name != target_item.name:
+        if master[result] is backup_entry:
             return True, result
         if (
             abs(ml.file_duration(os.path.join(target_item.path, target_item.name)) - master[result].original_duration)
             < 0.5
         ):
             return True, result
-        if ml.checksum(os.path.join(master[result].path, master[result].name)) == ml.checksum(
-            os.path.join(gb_target_path, target_item.name)
-        ):
+        if target.matches(master[result]):
             return True, result
-        result += 1
+    return False, 0
 
 
 def rename_file(orig: ml.Entries, target: ml.Entries) -> None:
@@ -74,7 +66,9 @@ def main() -> None:
 
     if (master := ml.read_master_file(args.master_input_path)) == []:
         ml.exit_error(f"{args.master_input_path} not found and is required.")
-    master.sort(key=lambda x: getattr(x, "original_size"))
+    by_original_size = ml.sorted_view(master, "original_size")
+    backups = ml.BackupIndex(master)
+    stored = ml.hash_states(master)
 
     if os.path.exists(gb_target_path):
         target_list = ml.create_file_list(gb_target_path)
@@ -83,13 +77,16 @@ def main() -> None:
         ml.exit_error(f"{gb_target_path} doesn't exist!")
 
     for item in target_list:
-        needs_rename, result = check_master(master, item)
+        needs_rename, result = check_master(master, by_original_size, backups, item)
         if needs_rename:
             if gb_verbose:
                 print(item.name)
                 print(master[result].name)
             rename_file(item, master[result])
 
+    if args.write_file:
+        ml.save_hash_changes(master, stored, args.master_input_path)
+
 
 if __name__ == "__main__":
     main()
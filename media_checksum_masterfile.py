@@ -0,0 +1,48 @@
+import argparse
+
+import media_library as ml
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fill in master file checksums.")
+    parser.add_argument(
+        "-a", type=str, dest="algorithm", default="md5", choices=sorted(ml.CHECKSUM_ALGORITHMS), help="Hash algorithm."
+    )
+    parser.add_argument("-d", action="store_true", default=False, dest="write_csv", help="Write CSV.")
+    parser.add_argument(
+        "-f", action="store_true", default=False, dest="force", help="Rehash entries that already have a checksum."
+    )
+    parser.add_argument("-i", type=str, dest="master_input_path", default="master_filelist")
+    parser.add_argument("-j", type=int, dest="workers", default=0, help="Worker processes, default cpu count.")
+    parser.add_argument("-n", action="store_true", default=False, dest="no_action", help="No action.")
+    parser.add_argument("-o", type=str, dest="master_output_path", required=False)
+    args = parser.parse_args()
+    return args
+
+
+def main() -> None:
+    args = get_args()
+    if args.master_output_path:
+        master_output_path = args.master_output_path
+    else:
+        master_output_path = args.master_input_path
+
+    if (master := ml.read_master_file(args.master_input_path)) == []:
+        ml.exit_error(f"{args.master_input_path} not found and is required.")
+
+    targets = [entry for entry in master if args.force or entry.csum == ""]
+    size = sum(entry.current_size for entry in targets)
+    print(f"{len(targets)} of {len(master)} entries to hash, {size / 1e9:.2f} GB.")
+    if args.no_action or targets == []:
+        return
+
+    stats = ml.ChecksumStats()
+    updated = ml.checksum_entries(targets, args.algorithm, args.workers, stats)
+    print(stats)
+    if len(updated) != len(targets):
+        print(f"{len(targets) - len(updated)} files couldn't be read.")
+    ml.save_master_changes(master, args.master_input_path, master_output_path, updated, write_csv=args.write_csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -70,7 +70,7 @@ def main():
 
     args = get_args()
 
-    if (master := ml.read_master_file(args.master_input_path)) == []:
+    if (master := ml.read_master_file(args.master_input_path, fields=["name"])) == []:
         ml.exit_error(f"{args.master_input_path} not found and is required.")
 
     name_search = ml.prepare_name_search(args.first_names_file_input_path, args.full_names_file_input_path)
@@ -0,0 +1,30 @@
+import argparse
+import os
+
+import media_library as ml
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fold the master_filelist journal into a new snapshot.")
+    parser.add_argument("-d", action="store_true", default=False, dest="write_csv", help="Write CSV.")
+    parser.add_argument("-i", type=str, dest="master_input_path", default="master_filelist")
+    parser.add_argument("-v", action="store_true", default=False, dest="verbose", help="Verbose.")
+    args = parser.parse_args()
+    return args
+
+
+def main() -> None:
+    args = get_args()
+
+    if not os.path.exists(args.master_input_path):
+        ml.exit_error(f"{args.master_input_path} not found and is required.")
+    if args.verbose:
+        print(f"{len(ml.read_journal(args.master_input_path))} journal records pending.")
+
+    ml.compact_master_file(args.master_input_path)
+    if args.write_csv:
+        ml.write_csv_file(ml.read_master_file(args.master_input_path), args.master_input_path + ".csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import argparse
+
+import media_library as ml
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Convert master_filelist between storage formats.")
+    parser.add_argument("master_output_path", nargs=1)
+    parser.add_argument("-d", action="store_true", default=False, dest="write_csv", help="Write CSV.")
+    parser.add_argument(
+        "-f",
+        type=str,
+        dest="storage_format",
+        default="sqlite",
+        choices=sorted(ml.MASTER_FORMATS),
+        help="Output storage format.",
+    )
+    parser.add_argument("-i", type=str, dest="master_input_path", default="master_filelist")
+    parser.add_argument("-v", action="store_true", default=False, dest="verbose", help="Verbose.")
+    args = parser.parse_args()
+    return args
+
+
+def main() -> None:
+    args = get_args()
+
+    if (master := ml.read_master_file(args.master_input_path, args.verbose)) == []:
+        ml.exit_error(f"{args.master_input_path} not found and is required.")
+    if args.verbose:
+        print(f"{args.master_input_path} ({ml.master_format(args.master_input_path)}) -> {args.storage_format}")
+
+    ml.write_entries_file(master, args.master_output_path[0], args.write_csv, storage_format=args.storage_format)
+
+
+if __name__ == "__main__":
+    main()
@@ -30,7 +30,7 @@ def get_args() -> argparse.Namespace:
 def convert_paths(paths_str: str) -> list[str]:
     paths_list = paths_str.split(",")
     paths_list = [path.strip(" ,[]").strip("'") for path in paths_list]
-    return paths_list
+    return [path for path in paths_list if path != ""]
 
 
 def main() -> None:
@@ -48,27 +48,31 @@ def main() -> None:
         r = csv.reader(f)
         next(r)
         for list_item in r:
-            item = Entries(*list_item)
+            # Columns are in ENTRY_FIELDS order; CSVs written before the newer fields existed lack them.
+            item = dict(zip(ml.ENTRY_FIELDS, list_item))
             entry = Entries(
-                UID=item.UID,
-                path=item.path,
-                name=item.name,
-                original_size=int(item.original_size),
-                current_size=int(item.current_size),
-                date=datetime.datetime.fromisoformat(item.date),
-                backups=int(item.backups),
-                paths=convert_paths(item.paths),
-                original_duration=float(item.original_duration),
-                current_duration=float(item.current_duration),
-                ino=int(item.ino),
-                nlink=int(item.nlink),
-                csum=item.csum,
-                data=ast.literal_eval(item.data),
+                UID=item["UID"],
+                path=item["path"],
+                name=item["name"],
+                original_size=int(item["original_size"]),
+                current_size=int(item["current_size"]),
+                date=datetime.datetime.fromisoformat(item["date"]),
+                backups=int(item["backups"]),
+                paths=convert_paths(item["paths"]),
+                original_duration=float(item["original_duration"]),
+                current_duration=float(item["current_duration"]),
+                ino=int(item["ino"]),
+                nlink=int(item["nlink"]),
+                csum=item["csum"],
+                data=ast.literal_eval(item["data"]),
+                csum_algo=item.get("csum_algo", "md5"),
+                fingerprint=item.get("fingerprint", ""),
+                fingerprint_stamp=item.get("fingerprint_stamp", ""),
+                csum_stamp=item.get("csum_stamp", ""),
             )
             master.append(entry)
 
     if args.write_file:
-        master.sort(key=lambda x: getattr(x, "current_size"))
         ml.write_entries_file(master, master_output_path, args.write_csv)
 
 
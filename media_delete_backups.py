@@ -24,13 +24,6 @@ def get_args() -> argparse.Namespace:
     return args
 
 
-def find_inode(target_list: list[Entries], inode: int):
-    for item in target_list:
-        if item.ino == inode:
-            return (1, item.name)
-    return (0, "")
-
-
 def remove_file(path: str):
     if gb_verbose:
         print(f"Deleting {path}")
@@ -41,26 +34,30 @@ def remove_file(path: str):
             return
 
 
-def delete_found_entry(target_path: str, filename: str, item: str, inode: int):
-    # Found the inode entry file, if duration matches entry, remove it.
+def check_found_entry(found: dict[str, Entries], target_path: str, filename: str, item: Entries, inode: int):
+    # Found the inode entry file, if size matches entry, queue it for the duration check.
     if gb_verbose:
         print(f"Found matching inode {inode} {item.name}: {filename}")
     if os.stat(os.path.join(target_path, filename)).st_size != item.current_size:
         if gb_verbose:
             print(f"Sizes don't match! {os.stat(os.path.join(target_path, filename)).st_size} {item.current_size}")
         return
-    if abs(ml.file_duration(os.path.join(target_path, filename)) - (item.current_duration)) < 0.5:
-        remove_file(os.path.join(target_path, filename))
-    else:
-        if gb_verbose:
-            print(
-                f"Durations don't match! {ml.file_duration(os.path.join(target_path, filename))} {item.current_duration}"
-            )
-        return
+    found[os.path.join(target_path, filename)] = item
+
+
+def delete_found_entries(found: dict[str, Entries]) -> None:
+    # Probe the queued files together, remove those whose duration matches their entry.
+    for path, duration in ml.probe_durations(found):
+        item = found[path]
+        if abs(duration - item.current_duration) < 0.5:
+            remove_file(path)
+        elif gb_verbose:
+            print(f"Durations don't match! {duration} {item.current_duration}")
 
 
 def process_deleted_entry(
-    target_list: list[Entries],
+    found: dict[str, Entries],
+    target_inodes: dict[int, str],
     item: Entries,
     backup_filepath: str,
     target_path: str,
@@ -78,29 +75,27 @@ def process_deleted_entry(
                 print(f"Inodes don't match! Actual: {backup_stat.st_ino} Recorded:{inode}")
             return
     else:
-        found, filename = find_inode(target_list, inode)
-        if found:
-            delete_found_entry(target_path, filename, item, inode)
+        if (filename := target_inodes.get(inode)) is not None:
+            check_found_entry(found, target_path, filename, item, inode)
         else:
             if gb_verbose:
                 print(f"No backup found: {backup_filepath}")
 
 
 def process_deleted_list(deleted: list[Entries], target_path: str, target_list: list[Entries]) -> None:
-    for item in deleted[:]:
-        for encoded_backup_path in item.paths:
-            if encoded_backup_path == "":
-                if gb_verbose:
-                    print(f"{os.path.join(item.path, item.name)}: No backup!")
-                continue
-            if gb_verbose:
-                print(f"Checking {encoded_backup_path}")
-            backup_path, inode = ml.split_backup_path(encoded_backup_path)
-            if backup_path != target_path.rstrip("/"):
-                continue
-            if os.path.exists(backup_path):
-                backup_filepath = os.path.join(backup_path, item.name)
-                process_deleted_entry(target_list, item, backup_filepath, target_path, inode)
+    backup_path = target_path.rstrip("/")
+    if not os.path.exists(backup_path):
+        return
+    target_inodes = {}
+    for item in target_list:
+        target_inodes.setdefault(item.ino, item.name)
+    found: dict[str, Entries] = {}
+    for inode, item in ml.BackupIndex(deleted).find_dir(backup_path).items():
+        if gb_verbose:
+            print(f"Checking {ml.make_backup_path_entry(backup_path, inode)}")
+        backup_filepath = os.path.join(backup_path, item.name)
+        process_deleted_entry(found, target_inodes, item, backup_filepath, target_path, inode)
+    delete_found_entries(found)
 
 
 def main() -> None:
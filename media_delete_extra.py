@@ -1,7 +1,6 @@
 import argparse
-import bisect
-import operator
 import os
+from typing import Optional
 
 import media_library as ml
 from media_library import Entries
@@ -27,8 +26,8 @@ def get_args() -> argparse.Namespace:
 
 
 def remove_backups(entry: ml.Entries) -> None:
-    for path in entry.paths:
-        path = path[: path.find("[")]
+    for backup_path in entry.paths:
+        path, _ = ml.split_backup_path(backup_path)
         if os.path.exists(os.path.join(path, entry.name)):
             os.unlink(os.path.join(path, entry.name))
             print(f"Deleting backup {os.path.join(path, entry.name)}")
@@ -42,33 +41,29 @@ def remove_file(path: str) -> None:
     print(f"Unlinking {path}")
 
 
-def remove_master_entry(master: list[ml.Entries], entry_num: int) -> list[ml.Entries]:
+def remove_master_entry(master: ml.MasterIndex, entry: ml.Entries) -> None:
     global gb_change_made
 
-    print(f"Removing entry {master[entry_num].name}")
-    del master[entry_num]
+    print(f"Removing entry {entry.name}")
+    master.remove(entry)
     gb_change_made = True
-    return master
 
 
-def process_entry(master: list[Entries], item: Entries, deleted_log: list[Entries]) -> None:
+def process_entry(master: ml.MasterIndex, item: Entries, deleted_log: ml.MasterIndex) -> Optional[Entries]:
 
-    deleted_entry = None
-    found, result = ml.check_inode(master, item.ino)
-    if found:
-        remove_backups(master[result])
-        deleted_entry = master[result]
-        master = remove_master_entry(master, result)
+    deleted_entry = master.find_dev_inode(item.device, item.ino)
+    if deleted_entry is not None:
+        remove_backups(deleted_entry)
+        remove_master_entry(master, deleted_entry)
     else:
-        found, result = ml.check_inode(deleted_log, item.ino)
-        if found:
+        if deleted_log.find_dev_inode(item.device, item.ino) is not None:
             print(f"{item.name} already logged.")
         else:
             print(f"{item.name} not found in master list.")
     if deleted_entry:
-        bisect.insort(deleted_log, deleted_entry, key=operator.attrgetter("current_size"))
+        deleted_log.add(deleted_entry)
         print(f"Logging {item.name}")
-    return (master, deleted_log)
+    return deleted_entry
 
 
 def main() -> None:
@@ -94,12 +89,20 @@ def main() -> None:
     else:
         ml.exit_error(f"{args.delete_path} doesn't exist!")
 
+    master_index = ml.MasterIndex(master)
+    deleted_index = ml.MasterIndex(deleted_log)
+    deleted = []
     for item in delete_list:
-        master, deleted_log = process_entry(master, item, deleted_log)
+        if deleted_entry := process_entry(master_index, item, deleted_index):
+            deleted.append(deleted_entry)
 
     if gb_change_made:
-        ml.write_entries_file(master, master_output_path, args.write_csv)
-        ml.write_entries_file(deleted_log, deleted_output_path, args.write_csv)
+        ml.save_master_changes(
+            master, args.master_input_path, master_output_path, deleted=deleted, write_csv=args.write_csv
+        )
+        ml.save_master_changes(
+            deleted_log, args.deleted_input_path, deleted_output_path, inserted=deleted, write_csv=args.write_csv
+        )
 
 
 if __name__ == "__main__":
@@ -23,28 +23,25 @@ def get_args() -> argparse.Namespace:
     )
     parser.add_argument("-n", action="store_true", default=False, dest="no_action", help="No action.")
     parser.add_argument("-v", action="store_true", default=False, dest="verbose", help="Verbose.")
+    ml.add_write_hashes_argument(parser)
     args = parser.parse_args()
     return args
 
 
-def check_target(target_path: str, master: list[ml.Entries], item: ml.Entries) -> Tuple[bool, int]:
+def check_target(
+    target_path: str, master: list[ml.Entries], by_original_size: ml.SortedView, item: ml.Entries
+) -> Tuple[bool, int]:
     found, result = ml.check_db(master, item)
     if found:
         return found, result
-    found, result = ml.check_original_size(master, item.original_size)
-    if found:
-        checksum = ml.checksum(os.path.join(target_path, item.name))
-        target_found = False
-        while not target_found:
-            if ml.checksum(os.path.join(master[result].path, master[result].name)) == checksum:
-                return found, result
-            if gb_verbose:
-                print(f"Master entry: {master[result].name}")
-                print(f"Target file: {item.name}")
-                print("Files are same size.\n")
-            found, result = ml.check_original_size(master, item.original_size, result)
-            if not found:
-                return False, 0
+    target = ml.DuplicateCheck(os.path.join(target_path, item.name))
+    for result in by_original_size.equal(item.original_size):
+        if target.matches(master[result]):
+            return True, result
+        if gb_verbose:
+            print(f"Master entry: {master[result].name}")
+            print(f"Target file: {item.name}")
+            print("Files are same size.\n")
     return False, 0
 
 
@@ -61,7 +58,8 @@ def main() -> None:
 
     if (master := ml.read_master_file(args.master_input_path)) == []:
         ml.exit_error(f"{args.master_input_path} not found and is required.")
-    master.sort(key=lambda x: getattr(x, "original_size"))
+    by_original_size = ml.sorted_view(master, "original_size")
+    stored = ml.hash_states(master)
 
     if os.path.exists(target_path):
         target_list = ml.create_file_list(target_path)
@@ -71,7 +69,7 @@ def main() -> None:
         ml.exit_error(f"{target_path} doesn't exist!")
 
     for item in target_list:
-        found, result = check_target(target_path, master, item)
+        found, result = check_target(target_path, master, by_original_size, item)
         if found:
             if not os.path.exists(trash_path) and not gb_no_action:
                 os.mkdir(trash_path)
@@ -95,6 +93,9 @@ def main() -> None:
             if gb_verbose:
                 print()
 
+    if args.write_file:
+        ml.save_hash_changes(master, stored, args.master_input_path, gb_write_csv)
+
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,4 @@
 import argparse
-import operator
 import os
 import re
 import subprocess
@@ -130,15 +129,18 @@ def main():
 
     args = get_args()
 
-    if (master := ml.read_master_file(args.master_input_path)) == []:
+    if (
+        master := ml.read_master_file(
+            args.master_input_path, fields=["path", "name", "original_size", "original_duration", "data"]
+        )
+    ) == []:
         ml.exit_error(f"{args.master_input_path} not found and is required.")
 
-    master.sort(key=operator.attrgetter("original_duration"))
     name_search = ml.prepare_name_search(args.first_names_file_input_path, args.full_names_file_input_path)
     master = embed_names(master, name_search)
     last_length = 0.0
     last_i = 0
-    for i, item in enumerate(master):
+    for i in ml.sorted_view(master, "original_duration"):
         length = master[i].original_duration
         if (abs(length - last_length) >= 0.000 and abs(length - last_length) < 0.001) and (
             master[last_i].data["vendor"] == "Unknown" or master[i].data["vendor"] == "Unknown"
@@ -1,11 +1,11 @@
 import argparse
 import itertools
-import operator
 import os
 import platform
 import re
 import subprocess
 import time
+from typing import Iterable
 
 import ahocorasick_rs as ah
 import getch
@@ -73,7 +73,7 @@ def get_12APQSZ() -> str:
             return response.upper()
 
 
-def assemble_name_lists(master: list[ml.Entries], ns: ml.NameSearch):
+def assemble_name_lists(master: list[ml.Entries], order: Iterable[int], ns: ml.NameSearch):
     """
     Search each entry in master, finding hits against a list of targets.
     Then match that list to a regex, and return the list of indexes to entries that match.
@@ -81,7 +81,8 @@ def assemble_name_lists(master: list[ml.Entries], ns: ml.NameSearch):
     name_refs = {}
     unlisted_name_refs = {}
     vendors = {}
-    for i, item in enumerate(master):
+    for i in order:
+        item = master[i]
         vendor = ml.get_vendor(item.name)
         if vendor not in vendors.keys():
             vendors[vendor] = []
@@ -162,13 +163,18 @@ def main():
 
     args = get_args()
 
-    if (master := ml.read_master_file(args.master_input_path)) == []:
+    if (
+        master := ml.read_master_file(
+            args.master_input_path, fields=["path", "name", "original_size", "original_duration"]
+        )
+    ) == []:
         ml.exit_error(f"{args.master_input_path} not found and is required.")
 
     response = -1
-    master.sort(key=operator.attrgetter("original_duration"))
     name_search = ml.prepare_name_search(args.first_names_file_input_path, args.full_names_file_input_path)
-    name_refs, unlisted_name_refs, vendors = assemble_name_lists(master, name_search)
+    name_refs, unlisted_name_refs, vendors = assemble_name_lists(
+        master, ml.sorted_view(master, "original_duration"), name_search
+    )
     for name in sorted(name_refs.keys()):
         print(name)
         deleted_list = []
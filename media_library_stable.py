@@ -1,21 +1,38 @@
 # Media Library Version 24-11-10-a
 
+import argparse
+import asyncio
 import bisect
-import copy
+import concurrent.futures
 import csv
+import ctypes
+import ctypes.util
 import datetime
 import hashlib
+import heapq
+import itertools
+import json
+import mmap
 import operator
 import os
 import pathlib
 import pickle
 import re
+import select
 import shutil
+import sqlite3
+import struct
+import subprocess
 import sys
+import threading
+import time
+from collections.abc import MutableSequence
 from dataclasses import dataclass, field
-from typing import Any, Callable, Tuple
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Tuple
 
+import appdirs
 import ffmpeg
+import numpy as np
 
 import ahocorasick_rs as ah
 
@@ -55,28 +72,288 @@ class NameSearch:
     ah_search: object = None
 
 
-@dataclass
+class DirectoryTable:
+    """
+    Directory strings shared by every entry, each stored once and referenced by a small integer id.
+    """
+
+    def __init__(self):
+        self.paths: list[str] = []
+        self.ids: dict[str, int] = {}
+        self.devices: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def id(self, path: str) -> int:
+        if (dir_id := self.ids.get(path)) is None:
+            dir_id = self.ids[path] = len(self.paths)
+            self.paths.append(path)
+        return dir_id
+
+    def path(self, dir_id: int) -> str:
+        return self.paths[dir_id]
+
+    def device(self, dir_id: int) -> int:
+        """
+        Return (and cache) the st_dev of a directory, None if it can't be reached.
+        """
+        if dir_id not in self.devices:
+            try:
+                self.devices[dir_id] = os.stat(self.paths[dir_id]).st_dev
+            except OSError:
+                self.devices[dir_id] = None
+        return self.devices[dir_id]
+
+
+directories = DirectoryTable()
+
+
+class BackupRef(NamedTuple):
+    """
+    A backup pointer: the backup root, as an id into directories, and the inode of the copy there.
+    The "root/[inode]" string form is only used for CSV and for pickles.
+    """
+
+    root_id: int
+    inode: int
+
+    @property
+    def root(self) -> str:
+        return directories.path(self.root_id)
+
+    def __str__(self) -> str:
+        return f"{self.root}/[{self.inode}]"
+
+
+# Backup pointers are held packed into one int, (inode << bits) | root id.
+# Strings not in "dir/[inode]" form are kept as they are, and refs past the id range as BackupRef.
+_BACKUP_DIR_BITS = 20
+_BACKUP_DIR_MASK = (1 << _BACKUP_DIR_BITS) - 1
+_BACKUP_PATH_RE = re.compile(r"(.*)/\[(\d+)\]")
+_backup_roots: dict[str, int] = {}
+
+
+def pack_backup_path(backup_path: Any) -> Any:
+    # Accepts a BackupRef, a "dir/[inode]" string, or the stored [dir, inode] pair.
+    if isinstance(backup_path, str):
+        if not (match := _BACKUP_PATH_RE.fullmatch(backup_path)) or str(int(match[2])) != match[2]:
+            return backup_path
+        backup_path = BackupRef(directories.id(match[1]), int(match[2]))
+    elif not isinstance(backup_path, BackupRef):
+        backup_path = BackupRef(directories.id(backup_path[0]), int(backup_path[1]))
+    if backup_path.root_id <= _BACKUP_DIR_MASK:
+        return (backup_path.inode << _BACKUP_DIR_BITS) | backup_path.root_id
+    return backup_path
+
+
+def unpack_backup_path(packed: Any) -> Any:
+    if isinstance(packed, int):
+        return BackupRef(packed & _BACKUP_DIR_MASK, packed >> _BACKUP_DIR_BITS)
+    return packed
+
+
+def backup_path_state(backup_path: Any) -> Any:
+    # Stored form: [root, inode], or the raw string for a pointer that never parsed.
+    if isinstance(backup_path, BackupRef):
+        return [backup_path.root, backup_path.inode]
+    return backup_path
+
+
+class BackupPaths(MutableSequence):
+    """
+    List view of an entry's packed backup pointers, read as BackupRef (written as BackupRef or
+    "dir/[inode]" strings). Entries without backups share an empty tuple until the first pointer is added.
+    """
+
+    __slots__ = ("entry",)
+
+    def __init__(self, entry: "Entries"):
+        self.entry = entry
+
+    @property
+    def packed(self) -> Any:
+        return self.entry._paths
+
+    def _mutable(self) -> list[Any]:
+        if isinstance(self.entry._paths, tuple):
+            self.entry._paths = list(self.entry._paths)
+        return self.entry._paths
+
+    def __len__(self) -> int:
+        return len(self.packed)
+
+    def __getitem__(self, i: Any) -> Any:
+        if isinstance(i, slice):
+            return [unpack_backup_path(packed) for packed in self.packed[i]]
+        return unpack_backup_path(self.packed[i])
+
+    def __setitem__(self, i: Any, value: Any) -> None:
+        if isinstance(i, slice):
+            self._mutable()[i] = [pack_backup_path(item) for item in value]
+        else:
+            self._mutable()[i] = pack_backup_path(value)
+
+    def __delitem__(self, i: Any) -> None:
+        del self._mutable()[i]
+
+    def insert(self, i: int, value: str) -> None:
+        self._mutable().insert(i, pack_backup_path(value))
+
+    def __contains__(self, value: Any) -> bool:
+        return pack_backup_path(value) in self.packed
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, BackupPaths):
+            return list(self.packed) == list(other.packed)
+        return list(self) == other
+
+    def __repr__(self) -> str:
+        return repr([str(backup_path) for backup_path in self])
+
+
+ENTRY_FIELDS = (
+    "UID",
+    "path",
+    "name",
+    "original_size",
+    "current_size",
+    "date",
+    "backups",
+    "paths",
+    "original_duration",
+    "current_duration",
+    "ino",
+    "nlink",
+    "csum",
+    "data",
+    "csum_algo",
+    "fingerprint",
+    "fingerprint_stamp",
+    "csum_stamp",
+)
+_ENTRY_DEFAULT_DATE = datetime.datetime.now()
+_NO_PATHS = ()
+
+
 class Entries:
-    UID: str = ""
-    path: str = ""
-    name: str = ""
-    original_size: int = 0
-    current_size: int = 0
-    date: datetime.datetime = datetime.datetime.now()
-    backups: int = 0
-    paths: list[str] = field(default_factory=list)
-    original_duration: float = 0.0
-    current_duration: float = 0.0
-    ino: int = 0
-    nlink: int = 0
-    csum: str = ""
-    data: dict[Any, Any] = field(default_factory=dict)
+    """
+    One master record. Slotted, with path kept as an id into directories, paths packed, and
+    data only allocated once used, but read and written through the same attributes as before.
+    """
 
+    __slots__ = (
+        "UID",
+        "_dir_id",
+        "name",
+        "original_size",
+        "current_size",
+        "date",
+        "backups",
+        "_paths",
+        "original_duration",
+        "current_duration",
+        "ino",
+        "nlink",
+        "csum",
+        "_data",
+        "csum_algo",
+        "fingerprint",
+        "fingerprint_stamp",
+        "csum_stamp",
+    )
 
-@dataclass
-class SortPointer:
-    key: Any
-    index: int = 0
+    def __init__(
+        self,
+        UID: str = "",
+        path: str = "",
+        name: str = "",
+        original_size: int = 0,
+        current_size: int = 0,
+        date: datetime.datetime = _ENTRY_DEFAULT_DATE,
+        backups: int = 0,
+        paths: list[str] = None,
+        original_duration: float = 0.0,
+        current_duration: float = 0.0,
+        ino: int = 0,
+        nlink: int = 0,
+        csum: str = "",
+        data: dict[Any, Any] = None,
+        csum_algo: str = "md5",
+        fingerprint: str = "",
+        fingerprint_stamp: str = "",
+        csum_stamp: str = "",
+    ):
+        self.UID = UID
+        self.path = path
+        self.name = name
+        self.original_size = original_size
+        self.current_size = current_size
+        self.date = date
+        self.backups = backups
+        self.paths = paths if paths is not None else []
+        self.original_duration = original_duration
+        self.current_duration = current_duration
+        self.ino = ino
+        self.nlink = nlink
+        self.csum = csum
+        self._data = data if data else None
+        self.csum_algo = csum_algo
+        self.fingerprint = fingerprint
+        self.fingerprint_stamp = fingerprint_stamp
+        self.csum_stamp = csum_stamp
+
+    @property
+    def path(self) -> str:
+        return directories.path(self._dir_id)
+
+    @path.setter
+    def path(self, value: str) -> None:
+        self._dir_id = directories.id(value)
+
+    @property
+    def device(self) -> int:
+        # st_dev of the entry's directory (cached per directory), None if it can't be reached.
+        return directories.device(self._dir_id)
+
+    @property
+    def paths(self) -> BackupPaths:
+        return BackupPaths(self)
+
+    @paths.setter
+    def paths(self, value: list[str]) -> None:
+        self._paths = [pack_backup_path(item) for item in value] if len(value) else _NO_PATHS
+
+    @property
+    def data(self) -> dict[Any, Any]:
+        if self._data is None:
+            self._data = {}
+        return self._data
+
+    @data.setter
+    def data(self, value: dict[Any, Any]) -> None:
+        self._data = value
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Pickled as a plain field dict, the same state the dataclass version wrote.
+        state = {field_name: getattr(self, field_name) for field_name in ENTRY_FIELDS if field_name != "data"}
+        state["paths"] = [str(backup_path) for backup_path in self.paths]
+        state["data"] = self._data if self._data is not None else {}
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(**state)
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, field_name) == getattr(other, field_name) for field_name in ENTRY_FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{field_name}={getattr(self, field_name)!r}" for field_name in ENTRY_FIELDS)
+        return f"Entries({fields})"
 
 
 def exit_error(*error_data: Any) -> None:
@@ -125,75 +402,843 @@ def checksum(
     return h.hexdigest()
 
 
-def file_duration(filename: str) -> float:
-    duration = 0
+CHECKSUM_ALGORITHMS = {"md5": hashlib.md5, "blake2b": hashlib.blake2b}
+CHECKSUM_READ_SIZE = 8 << 20
+
+
+def file_checksum(filename: str, algorithm: str = "md5", read_size: int = CHECKSUM_READ_SIZE) -> str:
+    """
+    checksum() for big files: multi-megabyte reads into one reused buffer, with the kernel told
+    to read ahead sequentially. Digests are the same as checksum() for the same algorithm.
+    """
+    h = CHECKSUM_ALGORITHMS[algorithm]()
+    buffer = bytearray(read_size)
+    view = memoryview(buffer)
+    with open(filename, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while length := f.readinto(buffer):
+            h.update(view[:length])
+    return h.hexdigest()
+
+
+FINGERPRINT_CHUNK_SIZE = 64 << 10
+
+
+def file_fingerprint(filename: str, chunk_size: int = FINGERPRINT_CHUNK_SIZE) -> str:
+    """
+    Cheap stand-in for a full checksum when ruling out duplicates: blake2b of the file size and
+    chunk_size bytes at the head, middle and tail. Different fingerprints mean different files,
+    equal ones still need a full checksum to call them duplicates.
+    """
+    with open(filename, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        h = hashlib.blake2b(size.to_bytes(8, "little"), digest_size=16)
+        for offset in (0, max(0, (size - chunk_size) // 2), max(0, size - chunk_size)):
+            f.seek(offset)
+            h.update(f.read(chunk_size))
+    return h.hexdigest()
+
+
+def entry_file_unchanged(entry: Entries, file_stat: os.stat_result) -> bool:
+    """True if file_stat still matches the inode, size and mtime recorded for the entry."""
+    return (
+        file_stat.st_ino == entry.ino
+        and file_stat.st_size == entry.current_size
+        and abs(file_stat.st_mtime - entry.date.timestamp()) < 0.001
+    )
+
+
+def file_stamp(file_stat: os.stat_result) -> str:
+    """The inode, size and mtime a stored hash was taken at, it holds while they still match."""
+    return f"{file_stat.st_ino}:{file_stat.st_size}:{file_stat.st_mtime_ns}"
+
+
+def entry_fingerprint(entry: Entries) -> str:
+    """
+    The entry's stored fingerprint while its file still matches fingerprint_stamp, otherwise a
+    fresh one, which is stored on the entry with its stamp for the caller to save.
+    """
+    file_path = os.path.join(entry.path, entry.name)
+    file_stat = os.stat(file_path)
+    stamp = file_stamp(file_stat)
+    if entry.fingerprint_stamp == "" and entry.fingerprint != "" and entry_file_unchanged(entry, file_stat):
+        # Fingerprinted before stamps were kept, trusted while the entry's own fields still match.
+        entry.fingerprint_stamp = stamp
+    if entry.fingerprint == "" or entry.fingerprint_stamp != stamp:
+        entry.fingerprint = file_fingerprint(file_path)
+        entry.fingerprint_stamp = stamp
+    return entry.fingerprint
+
+
+def entry_checksum(entry: Entries) -> str:
+    """
+    The entry's stored csum while its file still matches csum_stamp, otherwise a fresh one (with
+    the entry's csum_algo), which is stored on the entry with its stamp for the caller to save.
+    """
+    file_path = os.path.join(entry.path, entry.name)
+    file_stat = os.stat(file_path)
+    stamp = file_stamp(file_stat)
+    if entry.csum_stamp == "" and entry.csum != "" and entry_file_unchanged(entry, file_stat):
+        # Hashed before stamps were kept, trusted while the entry's own fields still match.
+        entry.csum_stamp = stamp
+    if entry.csum == "" or entry.csum_stamp != stamp:
+        entry.csum = file_checksum(file_path, entry.csum_algo)
+        entry.csum_stamp = stamp
+    return entry.csum
+
+
+class DuplicateCheck:
+    """
+    Compare a file against master entries of the same size. Only pairs whose sampled fingerprints
+    agree are fully hashed, the file once per csum_algo and master files only when their csum is stale.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.fingerprint = ""
+        self.checksums: dict[str, str] = {}
+
+    def matches(self, entry: Entries) -> bool:
+        if self.fingerprint == "":
+            self.fingerprint = file_fingerprint(self.filename)
+        if entry_fingerprint(entry) != self.fingerprint:
+            return False
+        if entry.csum_algo not in self.checksums:
+            self.checksums[entry.csum_algo] = file_checksum(self.filename, entry.csum_algo)
+        return entry_checksum(entry) == self.checksums[entry.csum_algo]
+
+
+def add_write_hashes_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "-w",
+        action="store_true",
+        default=False,
+        dest="write_file",
+        help="Write computed fingerprints and checksums to master_filelist.",
+    )
+
+
+def hash_states(master: list[Entries]) -> list[tuple]:
+    # What entry_fingerprint and entry_checksum store, taken before a run for save_hash_changes.
+    return [(entry.fingerprint, entry.fingerprint_stamp, entry.csum, entry.csum_stamp) for entry in master]
+
+
+def save_hash_changes(master: list[Entries], stored: list[tuple], master_path: str, write_csv: bool = False) -> None:
+    """Save the entries whose fingerprint or csum was computed since stored = hash_states(master)."""
+    updated = [entry for entry, now, before in zip(master, hash_states(master), stored) if now != before]
+    save_master_changes(master, master_path, master_path, updated, write_csv=write_csv)
+
+
+def _checksum_job(filename: str, algorithm: str, read_size: int) -> Tuple[str, int]:
+    # Runs in a worker process, a file that can't be read gets an empty checksum.
     try:
-        info = ffmpeg.probe(filename)
-        duration = info["format"]["duration"]
-    except ffmpeg.Error as e:
-        print()
-        print(e.stderr)
-        print()
-        return -1
-    return float(duration)
+        return file_checksum(filename, algorithm, read_size), os.stat(filename).st_size
+    except OSError as e:
+        print(f"{filename}: {e}", file=sys.stderr)
+        return "", 0
 
 
-### Database operations
+@dataclass
+class ChecksumStats:
+    files: int = 0
+    size: int = 0
+    seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        # MB/s over the wall clock time of the run.
+        return self.size / self.seconds / 1e6 if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.files} files, {self.size / 1e9:.2f} GB in {self.seconds:.1f}s, {self.throughput:.1f} MB/s"
+
+
+def checksum_files(
+    paths: Iterable[str],
+    algorithm: str = "md5",
+    workers: int = 0,
+    read_size: int = CHECKSUM_READ_SIZE,
+    stats: ChecksumStats = None,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Hash many files in a pool of workers (default: cpu count) processes, yielding (path, digest)
+    in completion order; a file that can't be read yields "". As in probe_durations, only
+    2 * workers paths are queued ahead. Files, bytes and elapsed time are added to stats.
+    """
+    workers = workers or os.cpu_count() or 1
+    paths = iter(paths)
+    pending: dict[concurrent.futures.Future, str] = {}
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            for path in itertools.islice(paths, 2 * workers - len(pending)):
+                pending[pool.submit(_checksum_job, path, algorithm, read_size)] = path
+            if not pending:
+                return
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                digest, size = future.result()
+                if stats is not None:
+                    stats.files += 1
+                    stats.size += size
+                    stats.seconds = time.perf_counter() - start
+                yield pending.pop(future), digest
+
+
+def checksum_entries(
+    entries: list[Entries], algorithm: str = "md5", workers: int = 0, stats: ChecksumStats = None
+) -> list[Entries]:
+    """
+    Set csum, csum_algo and csum_stamp on entries from their files with checksum_files. Return the
+    entries that were updated; unreadable files keep their old checksum.
+    """
+    by_path = {os.path.join(entry.path, entry.name): entry for entry in entries}
+    # Stamped before hashing, so a file written meanwhile is rehashed next time rather than trusted.
+    stamps = {}
+    for path in by_path:
+        try:
+            stamps[path] = file_stamp(os.stat(path))
+        except OSError:
+            stamps[path] = ""
+    updated = []
+    for path, digest in checksum_files(by_path, algorithm, workers, stats=stats):
+        if digest != "":
+            by_path[path].csum = digest
+            by_path[path].csum_algo = algorithm
+            by_path[path].csum_stamp = stamps[path]
+            updated.append(by_path[path])
+    return updated
 
 
-def pointer_sort_database(database: list[Entries], sort_key: str = "original_size") -> list[SortPointer]:
+PROBE_TIMEOUT = 60.0
+FFPROBE_ARGS = ("ffprobe", "-show_format", "-show_streams", "-of", "json")
 
-    pointers = [SortPointer(getattr(e, sort_key), i) for i, e in enumerate(database)]
-    pointers.sort(key=lambda x: getattr(x, "key"))
-    return pointers
 
+def ffprobe(filename: str, timeout: float = None) -> dict:
+    """ffmpeg.probe with a timeout; a hung ffprobe is killed and raised as an ffmpeg.Error."""
+    try:
+        result = subprocess.run([*FFPROBE_ARGS, filename], capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise ffmpeg.Error("ffprobe", b"", f"{filename}: ffprobe timed out after {timeout}s".encode())
+    if result.returncode != 0:
+        raise ffmpeg.Error("ffprobe", result.stdout, result.stderr)
+    return json.loads(result.stdout)
 
-def deepcopy_sort_database(database: list[Entries], sort_key: str):
-    new_db = []
-    for i, e in enumerate(database):
-        entry = copy.deepcopy(e)
-        entry.data["index"] = i
-        new_db.append(entry)
-    new_db.sort(key=lambda x: getattr(x, sort_key))
-    return new_db
 
+class ProbeCache:
+    """
+    ffprobe output kept in a per-user sqlite database, keyed by file identity (st_dev, st_ino) and
+    valid while the file's size and st_mtime_ns are unchanged. Shared by all scripts and threads;
+    failed probes are not stored.
+    """
 
-def file_md_tag(filename: str) -> Tuple[str, str]:
-    # Return tuple of empty strings if tag not found.
-    header = "###MDV1###"
+    def __init__(self, cache_path: str):
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self.db = sqlite3.connect(cache_path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS probes "
+            "(dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, info TEXT, PRIMARY KEY (dev, ino))"
+        )
+        self.db.commit()
+
+    def get(self, st: os.stat_result) -> dict:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT info FROM probes WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+                (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns),
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, st: os.stat_result, info: dict) -> None:
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?)",
+                (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, json.dumps(info)),
+            )
+            self.db.commit()
+
+
+_probe_cache: ProbeCache = None
+
+
+def probe_cache_path() -> str:
+    return os.path.join(appdirs.user_cache_dir("media_suite"), "probe_cache.sqlite")
+
+
+def probe_cache() -> ProbeCache:
+    # Opened on first use; if the cache can't be created, probing carries on without it.
+    global _probe_cache
+    if _probe_cache is None:
+        try:
+            _probe_cache = ProbeCache(probe_cache_path())
+        except (OSError, sqlite3.Error) as e:
+            print(f"Probe cache unavailable: {e}", file=sys.stderr)
+            _probe_cache = False
+    return _probe_cache
+
+
+def cached_probe_info(filename: str) -> Tuple[os.stat_result, dict]:
+    """
+    Return (stat, cached ffprobe output). The output is None on a cache miss, and stat is None if
+    the file can't be stat'ed, leaving ffprobe to report it.
+    """
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None, None
+    cache = probe_cache()
+    return st, cache.get(st) if cache else None
+
+
+def store_probe_info(st: os.stat_result, info: dict) -> None:
+    if st is not None and (cache := probe_cache()):
+        cache.put(st, info)
+
+
+def probe_info(filename: str, timeout: float = None) -> dict:
+    """ffprobe() answered from the probe cache when the file is unchanged since it was last probed."""
+    st, info = cached_probe_info(filename)
+    if info is None:
+        info = ffprobe(filename, timeout)
+        store_probe_info(st, info)
+    return info
+
+
+MD_TAG_HEADER = "###MDV1###"
+
+
+@dataclass
+class ProbeResult:
+    """
+    What one ffprobe tells us about a file. duration is -1 if the probe failed; md_duration and
+    md_size come from the ###MDV1### comment tag and are empty strings if there is none.
+    """
+
+    duration: float = -1
+    md_duration: str = ""
+    md_size: str = ""
+    codec: str = ""
+    bit_rate: int = 0
+    width: int = 0
+    height: int = 0
+    streams: int = 0
 
-    duration = 0
+    @property
+    def md_tag(self) -> Tuple[str, str]:
+        return (self.md_duration, self.md_size)
+
+
+def probe_file(filename: str, timeout: float = None) -> ProbeResult:
+    """Probe a file once (or answer from the probe cache) and return everything we use from it."""
     try:
-        info = ffmpeg.probe(filename)
+        info = probe_info(filename, timeout)
     except ffmpeg.Error as e:
         print()
         print(e.stderr)
         print()
-        return ("", "")
+        return ProbeResult()
+    return probe_result(info)
+
+
+def probe_result(info: dict) -> ProbeResult:
+    """Pick our fields out of ffprobe's JSON."""
+    container = info.get("format", {})
+    video = next((stream for stream in info.get("streams", []) if stream.get("codec_type") == "video"), {})
+    result = ProbeResult(
+        duration=float(container.get("duration", -1)),
+        codec=video.get("codec_name", ""),
+        bit_rate=int(container.get("bit_rate", 0)),
+        width=int(video.get("width", 0)),
+        height=int(video.get("height", 0)),
+        streams=len(info.get("streams", [])),
+    )
+    _set_md_tag(result, container.get("tags", {}).get("comment", ""))
+    return result
+
+
+def _set_md_tag(result: ProbeResult, comment: str) -> None:
+    if comment.startswith(MD_TAG_HEADER):
+        result.md_duration, result.md_size, *_ = comment[len(MD_TAG_HEADER) + 1 :].split(" ")
+
+
+_MP4_BOX_HEADER = struct.Struct(">I4s")
+
+
+def _mp4_boxes(f, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (type, payload offset, box end) for each box between start and end."""
+    offset = start
+    while offset + _MP4_BOX_HEADER.size <= end:
+        f.seek(offset)
+        size, box_type = _MP4_BOX_HEADER.unpack(f.read(_MP4_BOX_HEADER.size))
+        header = _MP4_BOX_HEADER.size
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header += 8
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise ValueError(f"Bad {box_type!r} box at {offset}.")
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def _mp4_find(f, start: int, end: int, *path: bytes) -> Tuple[int, int]:
+    """Return (payload offset, end) of the box at path below start:end, None if there isn't one."""
+    for box_type in path:
+        for found, payload, box_end in _mp4_boxes(f, start, end):
+            if found == box_type:
+                start, end = payload, box_end
+                break
+        else:
+            return None
+        if box_type == b"meta":
+            # ISO meta is a full box (version and flags first), QuickTime's isn't.
+            f.seek(start)
+            if f.read(4) == b"\0\0\0\0":
+                start += 4
+    return start, end
+
+
+def mp4_probe(filename: str) -> ProbeResult:
+    """
+    Read the duration (moov/mvhd) and the comment tag (moov/udta) straight from an MP4's boxes,
+    seeking past the media data, so only a few kilobytes are read. Codec and stream fields are
+    left unset. Return None for anything that isn't a plain MP4 with a known duration.
+    """
     try:
-        md_tag = info["format"]["tags"]["comment"]
-    except KeyError:
-        return ("", "")
-    if (header_start := md_tag.find(header)) != 0:
-        return ("", "")
-    duration, size, *_ = md_tag[header_start + 11 :].split(" ")
-    return (duration, size)
+        with open(filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if f.read(8)[4:] != b"ftyp" or (moov := _mp4_find(f, 0, size, b"moov")) is None:
+                return None
+            if (mvhd := _mp4_find(f, *moov, b"mvhd")) is None:
+                return None
+            f.seek(mvhd[0])
+            if f.read(4)[0] == 1:
+                _, _, timescale, duration = struct.unpack(">QQIQ", f.read(28))
+                unknown = 0xFFFFFFFFFFFFFFFF
+            else:
+                _, _, timescale, duration = struct.unpack(">IIII", f.read(16))
+                unknown = 0xFFFFFFFF
+            # Fragmented files leave the duration to the fragments.
+            if timescale == 0 or duration in (0, unknown):
+                return None
+            result = ProbeResult(duration=duration / timescale)
+            if (data := _mp4_find(f, *moov, b"udta", b"meta", b"ilst", b"\xa9cmt", b"data")) is not None:
+                # iTunes style, as ffmpeg writes it: type and locale, then the UTF-8 text.
+                f.seek(data[0] + 8)
+                comment = f.read(data[1] - data[0] - 8)
+            elif (text := _mp4_find(f, *moov, b"udta", b"\xa9cmt")) is not None:
+                # QuickTime style: length and language, then the text.
+                f.seek(text[0])
+                length = struct.unpack(">H", f.read(4)[:2])[0]
+                comment = f.read(length)
+            else:
+                comment = b""
+            _set_md_tag(result, comment.decode("utf-8", errors="replace"))
+            return result
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+
+
+def quick_probe(filename: str, timeout: float = None) -> ProbeResult:
+    """Duration and MD tag from the MP4 boxes when they can be read, otherwise from ffprobe."""
+    return mp4_probe(filename) or probe_file(filename, timeout)
+
+
+def file_duration(filename: str, timeout: float = None) -> float:
+    return quick_probe(filename, timeout).duration
+
+
+def probe_durations(
+    paths: Iterable[str], workers: int = 0, timeout: float = PROBE_TIMEOUT
+) -> Iterator[Tuple[str, float]]:
+    """
+    Probe many files with up to workers (default: cpu count) ffprobe processes at once, yielding
+    (path, duration) in completion order. Only 2 * workers paths are queued ahead of the running
+    probes, so a long iterable isn't drained up front. A failed or timed out probe yields -1.
+    """
+    workers = workers or os.cpu_count() or 1
+    paths = iter(paths)
+    pending: dict[concurrent.futures.Future, str] = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            for path in itertools.islice(paths, 2 * workers - len(pending)):
+                pending[pool.submit(file_duration, path, timeout)] = path
+            if not pending:
+                return
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
+### Database operations
+
+
+def file_md_tag(filename: str) -> Tuple[str, str]:
+    # Return tuple of empty strings if tag not found.
+    return quick_probe(filename).md_tag
+
+
+class AsyncMedia:
+    """
+    asyncio counterparts of the probe, hash, stat and copy helpers, so a batch of files can be
+    worked on at once. ffprobe runs as an asyncio subprocess; reading boxes, hashing, stat'ing
+    and copying run in the default executor. All share one semaphore, so at most limit
+    (default: cpu count) operations are in flight.
+    """
+
+    def __init__(self, limit: int = 0):
+        self.semaphore = asyncio.Semaphore(limit or os.cpu_count() or 1)
+
+    async def _run(self, func: Callable[..., Any], *args) -> Any:
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def ffprobe(self, filename: str, timeout: float = None) -> dict:
+        async with self.semaphore:
+            process = await asyncio.create_subprocess_exec(
+                *FFPROBE_ARGS, filename, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise ffmpeg.Error("ffprobe", b"", f"{filename}: ffprobe timed out after {timeout}s".encode())
+        if process.returncode != 0:
+            raise ffmpeg.Error("ffprobe", stdout, stderr)
+        return json.loads(stdout)
+
+    async def probe_file(self, filename: str, timeout: float = None) -> ProbeResult:
+        st, info = cached_probe_info(filename)
+        if info is None:
+            try:
+                info = await self.ffprobe(filename, timeout)
+            except ffmpeg.Error as e:
+                print()
+                print(e.stderr)
+                print()
+                return ProbeResult()
+            store_probe_info(st, info)
+        return probe_result(info)
+
+    async def quick_probe(self, filename: str, timeout: float = None) -> ProbeResult:
+        return await self._run(mp4_probe, filename) or await self.probe_file(filename, timeout)
+
+    async def file_duration(self, filename: str, timeout: float = None) -> float:
+        return (await self.quick_probe(filename, timeout)).duration
+
+    async def file_md_tag(self, filename: str) -> Tuple[str, str]:
+        return (await self.quick_probe(filename)).md_tag
+
+    async def checksum(self, filename: str, algorithm: str = "md5") -> str:
+        return await self._run(file_checksum, filename, algorithm)
+
+    async def stat(self, path: str) -> os.stat_result:
+        return await self._run(os.stat, path)
+
+    async def copy_file(self, source: str, target: str, verbose=False, no_action=False) -> None:
+        await self._run(copy_file, source, target, verbose, no_action)
+
+
+class MasterIndex:
+    """
+    Hash indexes over a master list: unique keys (st_dev, ino), (path, ino) and UID, and
+    multimaps for name, (current_size, name) and original_size. add, remove and update keep the
+    list (in current_size order) and the indexes in step.
+    """
+
+    def __init__(self, master: list[Entries]):
+        self.master = master
+        self.views = SortedViews(master)
+        self.devices: set[int] = set()
+        self.by_dev_ino: dict[Tuple[int, int], Entries] = {}
+        self.by_path_ino: dict[Tuple[str, int], Entries] = {}
+        self.by_uid: dict[str, Entries] = {}
+        self.by_name: dict[str, list[Entries]] = {}
+        self.by_size_name: dict[Tuple[int, str], list[Entries]] = {}
+        self.by_original_size: dict[int, list[Entries]] = {}
+        for entry in master:
+            self._index(entry)
+
+    def __len__(self) -> int:
+        return len(self.master)
+
+    def __getitem__(self, i: int) -> Entries:
+        return self.master[i]
+
+    def __iter__(self):
+        return iter(self.master)
+
+    def _index(self, entry: Entries) -> None:
+        device = entry.device
+        self.devices.add(device)
+        # Unique keys keep the first entry, as the linear scans did.
+        self.by_dev_ino.setdefault((device, entry.ino), entry)
+        self.by_path_ino.setdefault((entry.path, entry.ino), entry)
+        if entry.UID != "":
+            self.by_uid.setdefault(entry.UID, entry)
+        self.by_name.setdefault(entry.name, []).append(entry)
+        self.by_size_name.setdefault((entry.current_size, entry.name), []).append(entry)
+        self.by_original_size.setdefault(entry.original_size, []).append(entry)
+
+    def _unindex(self, entry: Entries) -> None:
+        for index, key in (
+            (self.by_dev_ino, (entry.device, entry.ino)),
+            (self.by_path_ino, (entry.path, entry.ino)),
+            (self.by_uid, entry.UID),
+        ):
+            if index.get(key) is entry:
+                del index[key]
+        for index, key in (
+            (self.by_name, entry.name),
+            (self.by_size_name, (entry.current_size, entry.name)),
+            (self.by_original_size, entry.original_size),
+        ):
+            entries = index[key]
+            entries.remove(next(item for item in entries if item is entry))
+            if not entries:
+                del index[key]
+
+    def position(self, entry: Entries) -> int:
+        """
+        Return the list index of entry, by bisecting on current_size when the list is in that order.
+        """
+        i = bisect.bisect_left(self.master, entry.current_size, key=operator.attrgetter("current_size"))
+        while i < len(self.master) and self.master[i].current_size == entry.current_size:
+            if self.master[i] is entry:
+                return i
+            i += 1
+        return next(i for i, item in enumerate(self.master) if item is entry)
+
+    def add(self, entry: Entries) -> None:
+        bisect.insort(self.master, entry, key=operator.attrgetter("current_size"))
+        self._index(entry)
+        self.views.invalidate()
+
+    def remove(self, entry: Entries) -> None:
+        del self.master[self.position(entry)]
+        self._unindex(entry)
+        self.views.invalidate()
+
+    def update(self, entry: Entries, **changes: Any) -> None:
+        """
+        Set fields on an indexed entry, reindexing it (and moving it if current_size changes).
+        """
+        if "current_size" in changes:
+            self.remove(entry)
+            for field_name, value in changes.items():
+                setattr(entry, field_name, value)
+            self.add(entry)
+            return
+        self._unindex(entry)
+        for field_name, value in changes.items():
+            setattr(entry, field_name, value)
+        self._index(entry)
+        self.views.invalidate(*changes)
+
+    def sorted_view(self, field_name: str) -> "SortedView":
+        return self.views[field_name]
+
+    def find_dev_inode(self, device: int, inode: int) -> Entries:
+        return self.by_dev_ino.get((device, inode))
+
+    def find_inode(self, inode: int) -> Entries:
+        for device in self.devices:
+            if (entry := self.by_dev_ino.get((device, inode))) is not None:
+                return entry
+        return None
+
+    def find_path_inode(self, path: str, inode: int) -> Entries:
+        return self.by_path_ino.get((path, inode))
+
+    def find_uid(self, uid: str) -> Entries:
+        return self.by_uid.get(uid)
+
+    def find_name(self, name: str) -> list[Entries]:
+        return self.by_name.get(name, [])
+
+    def find_size_name(self, size: int, name: str) -> list[Entries]:
+        return self.by_size_name.get((size, name), [])
+
+    def find_by_duration(
+        self, duration: float, tolerance: float, field_name: str = "current_duration"
+    ) -> list[Entries]:
+        """
+        Return the entries whose field_name (current_duration or original_duration) is within tolerance of duration.
+        """
+        return [self.master[i] for i in self.views[field_name].range(duration - tolerance, duration + tolerance)]
+
+    def find_by_durations(
+        self, durations: list[float], tolerance: float, field_name: str = "current_duration"
+    ) -> list[list[Entries]]:
+        """
+        find_by_duration for many durations in one vectorized pass.
+        """
+        durations = np.asarray(durations, dtype=np.float64)
+        return [
+            [self.master[i] for i in positions]
+            for positions in self.views[field_name].ranges(durations - tolerance, durations + tolerance)
+        ]
+
+    def find_original_size(self, size: int) -> list[Entries]:
+        return self.by_original_size.get(size, [])
+
+
+class SortedView:
+    """
+    Master positions in field_name order, with the sorted keys alongside for bisect style
+    queries. Master itself is never reordered or copied.
+    """
+
+    def __init__(self, master: Any, field_name: str, column: Any = None):
+        self.master = master
+        self.field_name = field_name
+        if column is None:
+            column = [getattr(entry, field_name) for entry in master]
+            if field_name in _COLUMNAR_NUMERIC and field_name != "date":
+                column = np.array(column, dtype=_COLUMNAR_NUMERIC[field_name])
+        if isinstance(column, np.ndarray):
+            self.order = np.argsort(column, kind="stable")
+            self.keys = column[self.order]
+        else:
+            self.order = np.array(sorted(range(len(column)), key=column.__getitem__), dtype=np.int64)
+            self.keys = [column[i] for i in self.order]
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __getitem__(self, rank: int) -> int:
+        return int(self.order[rank])
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.order.tolist())
+
+    def bisect_left(self, value: Any) -> int:
+        if isinstance(self.keys, np.ndarray):
+            return int(np.searchsorted(self.keys, value, side="left"))
+        return bisect.bisect_left(self.keys, value)
+
+    def bisect_right(self, value: Any) -> int:
+        if isinstance(self.keys, np.ndarray):
+            return int(np.searchsorted(self.keys, value, side="right"))
+        return bisect.bisect_right(self.keys, value)
+
+    def range(self, low: Any, high: Any) -> list[int]:
+        """
+        Return the master positions whose key lies in [low, high], in key order.
+        """
+        return self.order[self.bisect_left(low) : self.bisect_right(high)].tolist()
+
+    def equal(self, value: Any) -> list[int]:
+        return self.range(value, value)
+
+    def ranges(self, lows: Any, highs: Any) -> list[list[int]]:
+        """
+        Batched range(): one searchsorted call per bound array for all the queries.
+        """
+        starts = np.searchsorted(self.keys, lows, side="left")
+        ends = np.searchsorted(self.keys, highs, side="right")
+        return [self.order[start:end].tolist() for start, end in zip(starts.tolist(), ends.tolist())]
+
+    def entries(self) -> list[Entries]:
+        return [self.master[i] for i in self]
+
+
+class SortedViews:
+    """
+    SortedView cache for one master list. invalidate() drops the views of the named fields,
+    or all of them when entries are added or removed and positions shift.
+    """
+
+    def __init__(self, master: list[Entries]):
+        self.master = master
+        self.views: dict[str, SortedView] = {}
+
+    def __getitem__(self, field_name: str) -> SortedView:
+        if field_name not in self.views:
+            self.views[field_name] = SortedView(self.master, field_name)
+        return self.views[field_name]
+
+    def invalidate(self, *field_names: str) -> None:
+        for field_name in field_names or list(self.views):
+            self.views.pop(field_name, None)
+
+
+def sorted_view(master: Any, field_name: str) -> SortedView:
+    """
+    Return a sorted view of master by field_name, cached when master is a MasterIndex or MasterColumns.
+    """
+    if isinstance(master, (MasterIndex, MasterColumns)):
+        return master.sorted_view(field_name)
+    return SortedView(master, field_name)
+
+
+class BackupIndex:
+    """
+    Reverse index of backup pointers, backup root id -> {inode: entry}, read from the
+    entries' BackupRefs rather than re-parsing "dir/[inode]" strings.
+    """
+
+    def __init__(self, master: list[Entries]):
+        self.by_dir: dict[int, dict[int, Entries]] = {}
+        for entry in master:
+            self.add(entry)
+
+    @staticmethod
+    def references(entry: Entries) -> Iterator[Tuple[int, int]]:
+        for backup_path in entry.paths:
+            if isinstance(backup_path, BackupRef):
+                yield backup_path
+                continue
+            try:
+                backup_dir, inode = split_backup_path(backup_path)
+            except ValueError:
+                continue
+            yield directories.id(backup_dir), inode
+
+    def add(self, entry: Entries) -> None:
+        for dir_id, inode in self.references(entry):
+            self.by_dir.setdefault(dir_id, {}).setdefault(inode, entry)
+
+    def remove(self, entry: Entries) -> None:
+        for dir_id, inode in self.references(entry):
+            if (inodes := self.by_dir.get(dir_id)) is not None and inodes.get(inode) is entry:
+                del inodes[inode]
+
+    def find(self, backup_dir: str, inode: int) -> Entries:
+        return self.by_dir.get(backup_root_id(backup_dir), {}).get(inode)
+
+    def find_dir(self, backup_dir: str) -> dict[int, Entries]:
+        """
+        Return {inode: entry} for every entry with a backup in backup_dir.
+        """
+        return self.by_dir.get(backup_root_id(backup_dir), {})
 
 
 # Return True, result if size and name match.
 def check_db(database: list[Entries], item: Entries) -> Tuple[bool, int]:
-    start = 0
-    while True:
-        found, result = check_current_size(database, item.current_size, start)
-        if found:
-            if database[result].name == item.name:
-                return True, result
-            start = result
-        else:
-            return False, 0
+    if isinstance(database, MasterIndex):
+        if entries := database.find_size_name(item.current_size, item.name):
+            return True, database.position(entries[0])
+        return False, 0
+    found, result = check_current_size(database, item.current_size)
+    while found:
+        if database[result].name == item.name:
+            return True, result
+        result += 1
+        found = result < len(database) and database[result].current_size == item.current_size
+    return False, 0
 
 
 def check_inode(database: list[Entries], inode: int) -> Tuple[bool, int]:
+    if isinstance(database, MasterIndex):
+        if (entry := database.find_inode(inode)) is not None:
+            return (True, database.position(entry))
+        return (False, 0)
     for i, item in enumerate(database):
         if item.ino == inode:
             return (True, i)
@@ -201,33 +1246,27 @@ def check_inode(database: list[Entries], inode: int) -> Tuple[bool, int]:
 
 
 def check_inode_in_path(database: list[Entries], path: str, inode: int) -> Tuple[bool, int]:
+    if isinstance(database, MasterIndex):
+        if (entry := database.find_path_inode(path, inode)) is not None:
+            return (True, database.position(entry))
+        return (False, 0)
     for i, item in enumerate(database):
         if (item.ino == inode) and (item.path == path):
             return (True, i)
     return (False, 0)
 
 
-# Find an entry based on original file size, using a sorted list of pointers to master.
-# Return True, resulting master index if size matches.
-def check_pointers_to_original_size(pointers: list[SortPointer], size: int, start: int = 0) -> Tuple[bool, int]:
-    entry_size = operator.attrgetter("size")
-
-    if start > 0:
-        result = start + 1
-    else:
-        result = bisect.bisect_left(pointers, size, key=entry_size)
-    if result >= len(pointers) or pointers[result].size != size:
+# Find the one entry with this file name (and current size, if given).
+# A name held by entries in several directories is ambiguous: list them and return False.
+def check_name(database: MasterIndex, name: str, size: int = -1) -> Tuple[bool, int]:
+    entries = [entry for entry in database.find_name(name) if size < 0 or entry.current_size == size]
+    if len(entries) > 1:
+        print(f"{name} is ambiguous, found in:")
+        for entry in entries:
+            print(f"    {entry.path}")
+    if len(entries) != 1:
         return (False, 0)
-    return (True, pointers[result].index)
-
-
-def check_pointers_to_name(pointers: list[SortPointer], name: str):
-    key = operator.attrgetter("key")
-
-    result = bisect.bisect_left(pointers, name, key=key)
-    if result >= len(pointers):
-        return (False, "")
-    return (True, pointers[result].index)
+    return (True, database.position(entries[0]))
 
 
 # Return True, result if size matches.
@@ -243,33 +1282,31 @@ def check_current_size(database: list[Entries], size: int, start: int = 0) -> Tu
     return (True, result)
 
 
-# Find an entry based on original file size, using a sorted copy of master.
-# Return True, result if size matches.
-def check_original_size(database: list[Entries], size: int, start: int = 0) -> Tuple[bool, int]:
-    entry_size = operator.attrgetter("original_size")
-
-    if start > 0:
-        result = start + 1
-    else:
-        result = bisect.bisect_left(database, size, key=entry_size)
-    if result >= len(database) or database[result].original_size != size:
-        return (False, 0)
-    return (True, result)
+def backup_root_id(path: str) -> int:
+    # Resolving is a chain of lstat/readlink calls, so each root is only resolved once per run.
+    if (root_id := _backup_roots.get(path)) is None:
+        root_id = _backup_roots[path] = directories.id(pathlib.Path(path).expanduser().resolve().as_posix())
+    return root_id
 
 
-def make_backup_path_entry(path: str, inode: int) -> str:
-    processed_path = pathlib.Path(path).expanduser().resolve()
-    return processed_path.joinpath(f"[{inode}]").as_posix()
+def make_backup_path_entry(path: str, inode: int) -> BackupRef:
+    return BackupRef(backup_root_id(path), int(inode))
 
 
-def split_backup_path(path: str) -> Tuple[str, int]:
+def split_backup_path(path: Any) -> Tuple[str, int]:
+    if isinstance(path, BackupRef):
+        return path.root, path.inode
     split_point = path.find("[")
     end_point = path.find("]")
     return os.path.normpath(path[0:split_point]), int(path[split_point + 1 : end_point])
 
 
-def create_file_entry(path: str, update_duration: bool = False) -> Entries:
-    stat_entry = os.stat(path)
+MEDIA_EXTENSIONS = (".mp4", ".mp4~")
+
+
+def create_file_entry(path: str, update_duration: bool = False, stat_entry: os.stat_result = None) -> Entries:
+    if stat_entry is None:
+        stat_entry = os.stat(path)
     if update_duration:
         duration = file_duration(path)
     else:
@@ -292,89 +1329,1105 @@ def create_file_entry(path: str, update_duration: bool = False) -> Entries:
     return entry
 
 
-def create_file_list(path: str, update_duration: bool = False) -> list[Entries]:
-    entry_size = operator.attrgetter("current_size")
-    file_entries: list[Entries] = []
-    files = [
-        f
-        for f in os.listdir(path)
-        if os.path.isfile(os.path.join(path, f)) and os.path.splitext(f)[1] in [".mp4", ".mp4~"]
-    ]
-    for f in files:
-        entry = create_file_entry(os.path.join(path, f), update_duration)
-        bisect.insort(file_entries, entry, key=entry_size)
+def scan_cache_path(master_path: str) -> str:
+    return master_path + ".scancache"
+
+
+class ScanCache:
+    """
+    Directory listings kept from the last scan: per directory its st_mtime_ns, its subdirectories
+    and (ino, size, mtime, nlink) for each media file. Adding, removing or renaming a file changes
+    the directory mtime, so while it is unchanged the listing is reused without stat'ing the files.
+    Files rewritten in place keep the directory mtime and are not noticed.
+    """
+
+    def __init__(self, cache_path: str = ""):
+        self.dirs: dict[str, Tuple[int, list[str], dict[str, Tuple[int, int, float, int]]]] = {}
+        self.mtimes: dict[str, int] = {}
+        self.listings: dict[str, Any] = {}
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                self.dirs = pickle.load(f)
+
+    def dir_mtime(self, path: str) -> int:
+        # One stat per directory per run.
+        if path not in self.mtimes:
+            try:
+                self.mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                self.mtimes[path] = -1
+        return self.mtimes[path]
+
+    def listing(self, path: str) -> Tuple[list[str], dict[str, os.stat_result]]:
+        """
+        Return (subdirectories, {name: stat}) for an unchanged directory, None if it must be scanned.
+        """
+        if path not in self.listings:
+            if (cached := self.dirs.get(path)) is None or cached[0] != self.dir_mtime(path):
+                self.listings[path] = None
+            else:
+                self.listings[path] = (cached[1], {name: self._stat(*values) for name, values in cached[2].items()})
+        return self.listings[path]
+
+    def store(self, path: str, subdirs: list[str], files: dict[str, os.stat_result]) -> None:
+        self.dirs[path] = (
+            self.dir_mtime(path),
+            subdirs,
+            {name: (st.st_ino, st.st_size, st.st_mtime, st.st_nlink) for name, st in files.items()},
+        )
+
+    def stat(self, file_path: str) -> os.stat_result:
+        """
+        os.stat, answered from the listing when the file's directory is unchanged.
+        """
+        directory, name = os.path.split(file_path)
+        if (listing := self.listing(directory)) is None:
+            return os.stat(file_path)
+        if name not in listing[1]:
+            raise FileNotFoundError(file_path)
+        return listing[1][name]
+
+    @staticmethod
+    def _stat(ino: int, size: int, mtime: float, nlink: int) -> os.stat_result:
+        return os.stat_result((0, ino, 0, nlink, 0, 0, size, mtime, mtime, mtime))
+
+    def save(self, cache_path: str) -> None:
+        with open(cache_path + ".tmp", "wb") as f:
+            pickle.dump(self.dirs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_path + ".tmp", cache_path)
+
+
+def scan_files(
+    path: str, update_duration: bool = False, recursive: bool = False, cache: ScanCache = None
+) -> Iterator[Entries]:
+    """
+    Yield an entry per media file in path (and its subdirectories when recursive), in directory
+    order. One os.scandir pass per directory: the file type comes from the directory entry, and
+    each file is stat'ed exactly once. Symlinked directories are not followed. With a cache,
+    unchanged directories are listed from it, and scanned ones are stored in it.
+    """
+    pending = [path]
+    while pending:
+        directory = pending.pop()
+        if cache is not None and (listing := cache.listing(directory)) is not None:
+            subdirs, files = listing
+            if recursive:
+                pending.extend(subdirs)
+            for name, file_stat in files.items():
+                yield create_file_entry(os.path.join(directory, name), update_duration, file_stat)
+            continue
+        subdirs, files = [], {}
+        with os.scandir(directory) as it:
+            for dir_entry in it:
+                if dir_entry.is_dir(follow_symlinks=False):
+                    subdirs.append(dir_entry.path)
+                    if recursive:
+                        pending.append(dir_entry.path)
+                elif os.path.splitext(dir_entry.name)[1] in MEDIA_EXTENSIONS and dir_entry.is_file():
+                    files[dir_entry.name] = dir_entry.stat()
+                    yield create_file_entry(dir_entry.path, update_duration, files[dir_entry.name])
+        if cache is not None:
+            cache.store(directory, subdirs, files)
+
+
+def create_file_list(
+    path: str, update_duration: bool = False, recursive: bool = False, cache: ScanCache = None
+) -> list[Entries]:
+    file_entries = list(scan_files(path, update_duration, recursive, cache))
+    file_entries.sort(key=operator.attrgetter("current_size"))
     return file_entries
 
 
+def scan_roots(
+    roots: list[str], recursive: bool = False, workers_per_device: int = 1, cache: ScanCache = None
+) -> dict[str, list[Entries]]:
+    """
+    Scan several roots concurrently and return {root: size sorted entries}. Roots are grouped by
+    st_dev, each device getting its own thread pool, so disks are read in parallel but a disk is
+    never shared by more than workers_per_device scans.
+    """
+    by_device: dict[int, list[str]] = {}
+    for root in dict.fromkeys(roots):
+        by_device.setdefault(os.stat(root).st_dev, []).append(root)
+    pools = [concurrent.futures.ThreadPoolExecutor(max_workers=workers_per_device) for _ in by_device]
+    try:
+        futures = {
+            root: pool.submit(create_file_list, root, False, recursive, cache)
+            for pool, device_roots in zip(pools, by_device.values())
+            for root in device_roots
+        }
+        return {root: future.result() for root, future in futures.items()}
+    finally:
+        for pool in pools:
+            pool.shutdown()
+
+
+class Inotify:
+    """
+    Minimal Linux inotify binding over libc (ctypes). read() returns the pending events as
+    (directory, mask, name) tuples, waiting up to timeout seconds (None waits indefinitely).
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches: dict[int, str] = {}
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {path}")
+        # Watching the same directory again (after a move) returns its existing descriptor.
+        self.watches[wd] = path
+        return wd
+
+    def read(self, timeout: float = None) -> list[Tuple[str, int, str]]:
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 1 << 16)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & self.IN_IGNORED:
+                self.watches.pop(wd, None)
+            elif mask & self.IN_Q_OVERFLOW:
+                events.append(("", mask, ""))
+            elif wd in self.watches:
+                events.append((self.watches[wd], mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def merge_scans(scans: Iterable[list[Entries]]) -> Iterator[Entries]:
+    """
+    Merge size sorted scans (as from scan_roots) into one size sorted stream.
+    """
+    return heapq.merge(*scans, key=operator.attrgetter("current_size"))
+
+
+@dataclass
+class Changeset:
+    """
+    The difference between master and a filesystem scan. moved, resurrected and changed pair
+    an entry with the scanned file it now corresponds to (changed with the file's new size).
+    """
+
+    added: list[Entries] = field(default_factory=list)
+    moved: list[Tuple[Entries, Entries]] = field(default_factory=list)
+    missing: list[Entries] = field(default_factory=list)
+    resurrected: list[Tuple[Entries, Entries]] = field(default_factory=list)
+    changed: list[Tuple[Entries, int]] = field(default_factory=list)
+
+
+def reconcile_master(
+    master: list[Entries],
+    scanned: list[Entries],
+    roots: list[str],
+    stat: Callable[[str], os.stat_result] = os.stat,
+) -> Changeset:
+    """
+    Merge-join master against a scan of roots on (path, ino), then stat what is left over. A file
+    still at its old path is changed, or resurrected if the scan found it there with a new inode.
+    A file gone from under a scanned root is moved to the same (st_dev, st_ino) and size elsewhere,
+    failing that to the same size and mtime, and is otherwise missing. Entries outside the roots
+    are never matched against the scan, and ones that can't be stat'ed are left alone.
+    """
+    changes = Changeset()
+    path_ino = operator.attrgetter("path", "ino")
+    sort_key = operator.attrgetter("path", "ino", "name")
+    master_runs = [list(run) for _, run in itertools.groupby(sorted(master, key=sort_key), key=path_ino)]
+    scanned_runs = [list(run) for _, run in itertools.groupby(sorted(scanned, key=sort_key), key=path_ino)]
+    unmatched_master = []
+    unmatched_scanned = []
+    i = j = 0
+    while i < len(master_runs) and j < len(scanned_runs):
+        entries, founds = master_runs[i], scanned_runs[j]
+        if path_ino(entries[0]) < path_ino(founds[0]):
+            unmatched_master.extend(entries)
+            i += 1
+            continue
+        if path_ino(entries[0]) > path_ino(founds[0]):
+            unmatched_scanned.extend(founds)
+            j += 1
+            continue
+        # Hard links in one directory share (path, ino), so pair the same names before renames.
+        by_name = {found.name: found for found in founds}
+        renamed = []
+        for entry in entries:
+            if (found := by_name.pop(entry.name, None)) is None:
+                renamed.append(entry)
+            elif entry.current_size != found.current_size:
+                changes.changed.append((entry, found.current_size))
+        linked = len(renamed) < len(entries)
+        leftover = list(by_name.values())
+        for entry in renamed:
+            # A rename keeps size and mtime; anything else is a freed inode reused by a new file.
+            if leftover and (entry.current_size, entry.date) == (leftover[0].current_size, leftover[0].date):
+                changes.moved.append((entry, leftover.pop(0)))
+                linked = True
+            else:
+                unmatched_master.append(entry)
+        # Further links to a file master already knows are left alone.
+        if not linked:
+            unmatched_scanned.extend(leftover)
+        i += 1
+        j += 1
+    for entries in master_runs[i:]:
+        unmatched_master.extend(entries)
+    for founds in scanned_runs[j:]:
+        unmatched_scanned.extend(founds)
+
+    roots = [os.path.abspath(root) for root in roots]
+    by_path_name = {(found.path, found.name): found for found in unmatched_scanned}
+    gone = []
+    for entry in unmatched_master:
+        try:
+            size = stat(os.path.join(entry.path, entry.name)).st_size
+        except FileNotFoundError:
+            entry_path = os.path.abspath(entry.path)
+            if any(os.path.commonpath([root, entry_path]) == root for root in roots):
+                gone.append(entry)
+            else:
+                changes.missing.append(entry)
+            continue
+        except OSError:
+            continue
+        if (found := by_path_name.pop((entry.path, entry.name), None)) is not None:
+            if found.current_size == entry.current_size:
+                changes.resurrected.append((entry, found))
+            else:
+                changes.changed.append((entry, found.current_size))
+        elif size != entry.current_size:
+            changes.changed.append((entry, size))
+
+    # Moves and renames anywhere in the scan keep (st_dev, st_ino), size and mtime; a pair differing
+    # in either is inode reuse, as in the merge-join. An entry whose old directory is gone has no
+    # device to go by, so it is looked for on every scanned device.
+    by_dev_ino: dict[Tuple[int, int], list[Entries]] = {}
+    for found in by_path_name.values():
+        by_dev_ino.setdefault((found.device, found.ino), []).append(found)
+    devices = {device for device, _ in by_dev_ino}
+    moved_ids = set()
+    remaining = []
+    for entry in gone:
+        for device in [entry.device] if entry.device is not None else devices:
+            candidates = by_dev_ino.get((device, entry.ino), [])
+            if candidates and (candidates[0].current_size, candidates[0].date) == (entry.current_size, entry.date):
+                found = candidates.pop(0)
+                moved_ids.add(id(found))
+                changes.moved.append((entry, found))
+                break
+        else:
+            remaining.append(entry)
+
+    by_size_date: dict[Tuple[int, datetime.datetime], list[Entries]] = {}
+    for found in by_path_name.values():
+        if id(found) not in moved_ids:
+            by_size_date.setdefault((found.current_size, found.date), []).append(found)
+    for entry in remaining:
+        if candidates := by_size_date.get((entry.current_size, entry.date)):
+            found = candidates.pop(0)
+            moved_ids.add(id(found))
+            changes.moved.append((entry, found))
+        else:
+            changes.missing.append(entry)
+    changes.added = [found for found in by_path_name.values() if id(found) not in moved_ids]
+    return changes
+
+
+def apply_changeset(master: list[Entries], changes: Changeset) -> list[Entries]:
+    """
+    Apply a changeset in one pass: moved and resurrected entries take their file's location and
+    inode, missing ones are dropped, added ones appended, and the result sorted by current_size once.
+    """
+    for entry, found in changes.moved + changes.resurrected:
+        entry.path = found.path
+        entry.name = found.name
+        entry.ino = found.ino
+    missing_ids = {id(entry) for entry in changes.missing}
+    master = [entry for entry in master if id(entry) not in missing_ids] + changes.added
+    master.sort(key=operator.attrgetter("current_size"))
+    return master
+
+
 def get_entry_index(master: list[Entries], uid: str):
 
+    if isinstance(master, MasterIndex):
+        if (entry := master.find_uid(uid)) is not None:
+            return master.position(entry)
+        return None
     index = [i for i, entry in enumerate(master) if entry.UID == uid]
     if len(index) == 0:
         return None
     return index[0]
 
 
-def read_master_file(master_input_path: str, verbose: bool = False) -> list[Entries]:
+def assign_uids(master: list[Entries], inserted: list[Entries] = []) -> int:
+    """
+    Give every entry without a usable UID (empty or already taken) the next free one.
+    Inserted entries are checked last, so they never take a UID from an existing entry.
+    Return the number of UIDs assigned.
+    """
+    seen = set()
+    pending = []
+    next_uid = 0
+    inserted_ids = {id(entry) for entry in inserted}
+    for entry in [entry for entry in master if id(entry) not in inserted_ids] + inserted:
+        uid = str(entry.UID)
+        if uid == "" or uid in seen:
+            pending.append(entry)
+            continue
+        seen.add(uid)
+        if uid.isdigit():
+            next_uid = max(next_uid, int(uid) + 1)
+    for entry in pending:
+        entry.UID = f"{next_uid:06d}"
+        next_uid += 1
+    return len(pending)
+
+
+def apply_master_changes(master: list[Entries], updated: list[Entries], deleted: list[str]) -> list[Entries]:
+    """
+    Replace (or add) the updated entries and drop the deleted UIDs, matching on UID.
+    """
+    changes = {entry.UID: entry for entry in updated}
+    deleted_uids = set(deleted)
+    result = []
+    for entry in master:
+        if entry.UID in deleted_uids:
+            continue
+        result.append(changes.pop(entry.UID, entry))
+    result.extend(changes.values())
+    return result
+
+
+### Master file storage
+
+# Each storage format supplies a full reader and writer, an updater that commits only the
+# updated, deleted and inserted entries, a compactor, and optionally a projecting reader.
+# Pickle and columnar masters take updates through an append-only journal (master_path + ".journal") of
+# (operation, UID, entry) records. Readers replay it over the snapshot, and it's folded back
+# into a new snapshot once it grows past JOURNAL_COMPACT_RATIO of the snapshot size.
+
+
+@dataclass
+class MasterFormat:
+    read: Callable[[str], list[Entries]]
+    write: Callable[[list[Entries], str], None]
+    update: Callable[[str, list[Entries], list[str], list[Entries]], None]
+    compact: Callable[[str], None]
+    # Yield entries with only the named fields decoded, None if the format can't do better than read.
+    project: Callable[[str, list[str]], Iterator[Entries]] = None
+
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+JOURNAL_INSERT = "insert"
+JOURNAL_UPDATE = "update"
+JOURNAL_DELETE = "delete"
+JOURNAL_COMPACT_RATIO = 0.25
+
+
+def journal_path(master_path: str) -> str:
+    return master_path + ".journal"
+
+
+def read_journal(master_path: str) -> list[Tuple[str, str, Any]]:
+    records = []
+    if os.path.exists(journal_path(master_path)):
+        with open(journal_path(master_path), "rb+") as f:
+            while True:
+                offset = f.tell()
+                try:
+                    records.append(pickle.load(f))
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, IndexError):
+                    # A torn record from an interrupted write, cut it off so later appends are readable.
+                    print(f"{journal_path(master_path)}: dropping incomplete record.")
+                    f.truncate(offset)
+                    break
+    return records
+
+
+def append_journal(master_path: str, updated: list[Entries], deleted: list[str], inserted: list[Entries] = []) -> None:
+    with open(journal_path(master_path), "ab") as f:
+        for entry in inserted:
+            pickle.dump((JOURNAL_INSERT, entry.UID, entry), f)
+        for entry in updated:
+            pickle.dump((JOURNAL_UPDATE, entry.UID, entry), f)
+        for uid in deleted:
+            pickle.dump((JOURNAL_DELETE, uid, None), f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def replay_journal(master: list[Entries], records: list[Tuple[str, str, Any]]) -> list[Entries]:
+    # Fold the records down to the last operation per UID, then apply them in one pass.
+    # Inserts and updates are both upserts, so replaying a journal twice is harmless.
+    changes: dict[str, Any] = {}
+    for op, uid, entry in records:
+        changes[uid] = entry if op != JOURNAL_DELETE else None
+    master = apply_master_changes(
+        master,
+        [entry for entry in changes.values() if entry is not None],
+        [uid for uid, entry in changes.items() if entry is None],
+    )
+    master.sort(key=operator.attrgetter("current_size"))
+    return master
+
+
+def replay_pending_journal(master_path: str, master: list[Entries]) -> list[Entries]:
+    if records := read_journal(master_path):
+        # Journal records are keyed by the UIDs the snapshot had when they were written.
+        assign_uids(master)
+        master = replay_journal(master, records)
+    return master
+
+
+def retire_journal(master_path: str) -> None:
+    if os.path.exists(journal_path(master_path)):
+        os.remove(journal_path(master_path))
+
+
+def master_size(master_path: str) -> int:
+    if os.path.isdir(master_path):
+        return sum(entry.stat().st_size for entry in os.scandir(master_path))
+    return os.path.getsize(master_path)
+
+
+def update_journaled_master(
+    master_path: str, updated: list[Entries], deleted: list[str], inserted: list[Entries] = []
+) -> None:
+    append_journal(master_path, updated, deleted, inserted)
+    if os.path.getsize(journal_path(master_path)) > JOURNAL_COMPACT_RATIO * master_size(master_path):
+        compact_journaled_master(master_path)
+
+
+def compact_journaled_master(master_path: str) -> None:
+    if os.path.exists(journal_path(master_path)):
+        storage = MASTER_FORMATS[master_format(master_path)]
+        storage.write(storage.read(master_path), master_path)
+
+
+def read_pickle_master(master_input_path: str) -> list[Entries]:
+    with open(master_input_path, "rb") as f:
+        master = pickle.load(f)
+    return replay_pending_journal(master_input_path, master)
+
+
+def write_pickle_master(master: list[Entries], master_output_path: str) -> None:
+    # Write the new snapshot beside the old one, swap it in, then retire the journal it replaces.
+    temp_path = master_output_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        pickle.dump(master, f)
+    os.replace(temp_path, master_output_path)
+    retire_journal(master_output_path)
+
+
+_SQLITE_COLUMNS = (
+    ("UID", "TEXT NOT NULL"),
+    ("path", "TEXT"),
+    ("name", "TEXT"),
+    ("original_size", "INTEGER"),
+    ("current_size", "INTEGER"),
+    ("date", "TEXT"),
+    ("backups", "INTEGER"),
+    ("paths", "TEXT"),
+    ("original_duration", "REAL"),
+    ("current_duration", "REAL"),
+    ("ino", "INTEGER"),
+    ("nlink", "INTEGER"),
+    ("csum", "TEXT"),
+    ("data", "BLOB"),
+    ("csum_algo", "TEXT NOT NULL DEFAULT 'md5'"),
+    ("fingerprint", "TEXT NOT NULL DEFAULT ''"),
+    ("fingerprint_stamp", "TEXT NOT NULL DEFAULT ''"),
+    ("csum_stamp", "TEXT NOT NULL DEFAULT ''"),
+)
+_SQLITE_FIELDS = ", ".join(name for name, _ in _SQLITE_COLUMNS)
+_SQLITE_UPSERT = (
+    f"INSERT INTO entries ({_SQLITE_FIELDS}) VALUES ({', '.join('?' for _ in _SQLITE_COLUMNS)}) "
+    f"ON CONFLICT(UID) DO UPDATE SET {', '.join(f'{name} = excluded.{name}' for name, _ in _SQLITE_COLUMNS[1:])}"
+)
+_SQLITE_INDEXES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS entries_uid ON entries (UID)",
+    "CREATE INDEX IF NOT EXISTS entries_current_size ON entries (current_size)",
+    "CREATE INDEX IF NOT EXISTS entries_original_size ON entries (original_size)",
+    "CREATE INDEX IF NOT EXISTS entries_name ON entries (name)",
+    "CREATE INDEX IF NOT EXISTS entries_path_ino ON entries (path, ino)",
+)
+
+
+def _sql_int(value: int) -> int:
+    # SQLite integers are signed 64 bit, fold large inode numbers into that range.
+    value = int(value)
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _entry_to_row(entry: Entries) -> tuple:
+    return (
+        entry.UID,
+        entry.path,
+        entry.name,
+        int(entry.original_size),
+        int(entry.current_size),
+        entry.date.isoformat(),
+        int(entry.backups),
+        json.dumps([backup_path_state(backup_path) for backup_path in entry.paths]),
+        float(entry.original_duration),
+        float(entry.current_duration),
+        _sql_int(entry.ino),
+        int(entry.nlink),
+        entry.csum,
+        pickle.dumps(entry.data) if entry.data else None,
+        entry.csum_algo,
+        entry.fingerprint,
+        entry.fingerprint_stamp,
+        entry.csum_stamp,
+    )
+
+
+_SQLITE_DECODERS = {
+    "date": datetime.datetime.fromisoformat,
+    "paths": json.loads,
+    "ino": lambda value: value % (1 << 64),
+    "data": lambda value: pickle.loads(value) if value is not None else {},
+}
+
+
+def _row_to_entry(row: tuple, fields: tuple[str, ...] = ENTRY_FIELDS) -> Entries:
+    return Entries(
+        **{
+            field_name: _SQLITE_DECODERS[field_name](value) if field_name in _SQLITE_DECODERS else value
+            for field_name, value in zip(fields, row)
+        }
+    )
+
+
+def open_master_db(master_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(master_path)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS entries ({', '.join(f'{n} {t}' for n, t in _SQLITE_COLUMNS)})")
+    # Databases written before a column existed get it added, with its default.
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+    for name, column_type in _SQLITE_COLUMNS:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE entries ADD COLUMN {name} {column_type}")
+    for index in _SQLITE_INDEXES:
+        conn.execute(index)
+    return conn
+
+
+def read_sqlite_master(master_input_path: str) -> list[Entries]:
+    conn = open_master_db(master_input_path)
+    try:
+        rows = conn.execute(f"SELECT {_SQLITE_FIELDS} FROM entries ORDER BY current_size").fetchall()
+    finally:
+        conn.close()
+    return [_row_to_entry(row) for row in rows]
+
+
+def project_sqlite_master(master_input_path: str, fields: list[str]) -> Iterator[Entries]:
+    conn = open_master_db(master_input_path)
+    try:
+        for row in conn.execute(f"SELECT {', '.join(fields)} FROM entries ORDER BY current_size"):
+            yield _row_to_entry(row, fields)
+    finally:
+        conn.close()
+
+
+def write_sqlite_master(master: list[Entries], master_output_path: str) -> None:
+    # Diff against the stored rows so only new or changed entries are rewritten.
+    rows = {row[0]: row for row in map(_entry_to_row, master)}
+    conn = open_master_db(master_output_path)
+    try:
+        with conn:
+            stored = {row[0]: row for row in conn.execute(f"SELECT {_SQLITE_FIELDS} FROM entries")}
+            conn.executemany(_SQLITE_UPSERT, (row for uid, row in rows.items() if stored.get(uid) != row))
+            conn.executemany("DELETE FROM entries WHERE UID = ?", ((uid,) for uid in stored.keys() - rows.keys()))
+    finally:
+        conn.close()
+
+
+def update_sqlite_master(
+    master_path: str, updated: list[Entries], deleted: list[str], inserted: list[Entries] = []
+) -> None:
+    conn = open_master_db(master_path)
+    try:
+        with conn:
+            conn.executemany(_SQLITE_UPSERT, map(_entry_to_row, inserted + updated))
+            conn.executemany("DELETE FROM entries WHERE UID = ?", ((uid,) for uid in deleted))
+    finally:
+        conn.close()
+
+
+def compact_sqlite_master(master_path: str) -> None:
+    conn = open_master_db(master_path)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+# Columnar masters are a directory of NumPy arrays for the numeric columns and offset-indexed
+# string tables (offsets .npy plus a .bin blob) for the rest, all memory mapped when opened.
+# path is dictionary encoded against a table of directories.
+
+COLUMNAR_META = "meta.json"
+COLUMNAR_VERSION = 1
+_COLUMNAR_NUMERIC = {
+    "original_size": np.int64,
+    "current_size": np.int64,
+    "backups": np.int64,
+    "original_duration": np.float64,
+    "current_duration": np.float64,
+    "ino": np.uint64,
+    "nlink": np.int64,
+    "date": np.float64,
+}
+_COLUMNAR_TABLES = {
+    "UID": (lambda value: value.encode(), bytes.decode),
+    "name": (lambda value: value.encode(), bytes.decode),
+    "csum": (lambda value: value.encode(), bytes.decode),
+    "paths": (lambda value: json.dumps([backup_path_state(item) for item in value]).encode(), json.loads),
+    "data": (lambda value: pickle.dumps(value) if value else b"", lambda raw: pickle.loads(raw) if raw else {}),
+    "csum_algo": (lambda value: value.encode(), bytes.decode),
+    "fingerprint": (lambda value: value.encode(), bytes.decode),
+    "fingerprint_stamp": (lambda value: value.encode(), bytes.decode),
+    "csum_stamp": (lambda value: value.encode(), bytes.decode),
+}
+# Tables added after version 1, read as their default from masters written without them.
+_COLUMNAR_DEFAULTS = {"csum_algo": "md5", "fingerprint": "", "fingerprint_stamp": "", "csum_stamp": ""}
+
+
+class StringColumn:
+    """
+    Read only, memory mapped table of variable length values, decoded on access.
+    """
+
+    def __init__(self, offsets: np.ndarray, blob: Any, decode: Callable[[bytes], Any] = bytes.decode):
+        self.offsets = offsets
+        self.blob = blob
+        self.decode = decode
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> Any:
+        return self.decode(self.blob[self.offsets[i] : self.offsets[i + 1]])
+
+    def __iter__(self):
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            yield self.decode(self.blob[start:end])
+
+
+class IndexedColumn:
+    """
+    Dictionary encoded column: per row ids into a table of distinct values.
+    """
+
+    def __init__(self, ids: np.ndarray, values: Any):
+        self.ids = ids
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, i: int) -> Any:
+        return self.values[self.ids[i]]
+
+    def __iter__(self):
+        values = list(self.values)
+        for i in self.ids.tolist():
+            yield values[i]
+
+
+class MasterColumns:
+    """
+    Column oriented, read only view of a master: NumPy arrays for numeric fields (date as epoch
+    seconds), sequences for the rest. Entries are only built when rows are indexed.
+    """
+
+    def __init__(self, length: int, loader: Callable[[str], Any], entries: list[Entries] = None):
+        self.length = length
+        self.loader = loader
+        self.entries = entries
+        self.columns: dict[str, Any] = {}
+        self.views: dict[str, SortedView] = {}
+
+    @classmethod
+    def from_entries(cls, master: list[Entries]) -> "MasterColumns":
+        def loader(field_name: str) -> Any:
+            if field_name == "date":
+                return np.array([entry.date.timestamp() for entry in master], dtype=np.float64)
+            if field_name in _COLUMNAR_NUMERIC:
+                return np.array([getattr(entry, field_name) for entry in master], dtype=_COLUMNAR_NUMERIC[field_name])
+            return [getattr(entry, field_name) for entry in master]
+
+        return cls(len(master), loader, master)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, i: int) -> Entries:
+        if self.entries is not None:
+            return self.entries[i]
+        values = {}
+        for field_name in ENTRY_FIELDS:
+            if field_name == "date":
+                values[field_name] = columnar_date(self.column("date")[i].item(), bool(self.column("date_tz")[i]))
+            elif field_name in _COLUMNAR_NUMERIC:
+                values[field_name] = self.column(field_name)[i].item()
+            else:
+                values[field_name] = self.column(field_name)[i]
+        return Entries(**values)
+
+    def __iter__(self):
+        return self.iter_entries()
+
+    def iter_entries(self, fields: list[str] = ENTRY_FIELDS) -> Iterator[Entries]:
+        """
+        Yield an Entries per row, decoding only the given fields (the rest keep their defaults).
+        """
+        if self.entries is not None:
+            yield from self.entries
+            return
+        values = []
+        for field_name in fields:
+            if field_name == "date":
+                values.append(map(columnar_date, self.column("date").tolist(), self.column("date_tz").tolist()))
+            elif field_name in _COLUMNAR_NUMERIC:
+                values.append(self.column(field_name).tolist())
+            else:
+                values.append(iter(self.column(field_name)))
+        for row in zip(*values):
+            yield Entries(**dict(zip(fields, row)))
+
+    def column(self, field_name: str) -> Any:
+        if field_name not in self.columns:
+            self.columns[field_name] = self.loader(field_name)
+        return self.columns[field_name]
+
+    def sorted_view(self, field_name: str) -> SortedView:
+        """
+        Return (and cache) the rows sorted by field_name. The columns are read only, so the view never goes stale.
+        """
+        if field_name not in self.views:
+            self.views[field_name] = SortedView(self, field_name, self.column(field_name))
+        return self.views[field_name]
+
+    def argsort(self, field_name: str) -> np.ndarray:
+        return self.sorted_view(field_name).order
+
+    def find_equal(self, field_name: str, value: Any) -> np.ndarray:
+        """
+        Return the rows where field_name equals value.
+        """
+        column = self.column(field_name)
+        if isinstance(column, np.ndarray):
+            return np.flatnonzero(column == value)
+        return np.array([i for i, item in enumerate(column) if item == value], dtype=np.int64)
+
+
+def columnar_date(timestamp: float, utc: bool) -> datetime.datetime:
+    if utc:
+        return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+    return datetime.datetime.fromtimestamp(timestamp)
+
+
+def _write_string_table(table_path: str, values: list[bytes]) -> None:
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in values], out=offsets[1:])
+    np.save(table_path + ".offsets.npy", offsets)
+    with open(table_path + ".bin", "wb") as f:
+        f.write(b"".join(values))
+
+
+def _open_string_table(table_path: str, decode: Callable[[bytes], Any] = bytes.decode) -> StringColumn:
+    offsets = np.load(table_path + ".offsets.npy", mmap_mode="r")
+    with open(table_path + ".bin", "rb") as f:
+        blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+    return StringColumn(offsets, blob, decode)
+
+
+def open_columnar_master(master_input_path: str) -> MasterColumns:
+    with open(os.path.join(master_input_path, COLUMNAR_META), "r") as f:
+        meta = json.load(f)
+    if meta.get("version") != COLUMNAR_VERSION:
+        exit_error(f"{master_input_path}: unsupported columnar version {meta.get('version')}.")
+
+    def loader(field_name: str) -> Any:
+        column_path = os.path.join(master_input_path, field_name)
+        if field_name in _COLUMNAR_NUMERIC or field_name == "date_tz":
+            return np.load(column_path + ".npy", mmap_mode="r")
+        if field_name == "path":
+            return IndexedColumn(
+                np.load(column_path + ".ids.npy", mmap_mode="r"),
+                list(_open_string_table(os.path.join(master_input_path, "dirs"))),
+            )
+        if field_name in _COLUMNAR_DEFAULTS and not os.path.exists(column_path + ".bin"):
+            return [_COLUMNAR_DEFAULTS[field_name]] * meta["count"]
+        return _open_string_table(column_path, _COLUMNAR_TABLES[field_name][1])
+
+    return MasterColumns(meta["count"], loader)
+
+
+def read_columnar_master(master_input_path: str) -> list[Entries]:
+    return replay_pending_journal(master_input_path, list(open_columnar_master(master_input_path)))
+
+
+def project_columnar_master(master_input_path: str, fields: list[str]) -> Iterator[Entries]:
+    return open_columnar_master(master_input_path).iter_entries(fields)
+
+
+def write_columnar_master(master: list[Entries], master_output_path: str) -> None:
+    temp_path = master_output_path + ".tmp"
+    if os.path.exists(temp_path):
+        shutil.rmtree(temp_path)
+    os.mkdir(temp_path)
+    for field_name, dtype in _COLUMNAR_NUMERIC.items():
+        if field_name == "date":
+            values = [entry.date.timestamp() for entry in master]
+        else:
+            values = [getattr(entry, field_name) for entry in master]
+        np.save(os.path.join(temp_path, field_name + ".npy"), np.array(values, dtype=dtype))
+    np.save(
+        os.path.join(temp_path, "date_tz.npy"),
+        np.array([entry.date.tzinfo is not None for entry in master], dtype=np.uint8),
+    )
+    for field_name, (encode, _) in _COLUMNAR_TABLES.items():
+        _write_string_table(
+            os.path.join(temp_path, field_name), [encode(getattr(entry, field_name)) for entry in master]
+        )
+    dirs: dict[str, int] = {}
+    path_ids = np.array([dirs.setdefault(entry.path, len(dirs)) for entry in master], dtype=np.int32)
+    np.save(os.path.join(temp_path, "path.ids.npy"), path_ids)
+    _write_string_table(os.path.join(temp_path, "dirs"), [path.encode() for path in dirs])
+    with open(os.path.join(temp_path, COLUMNAR_META), "w") as f:
+        json.dump({"version": COLUMNAR_VERSION, "count": len(master)}, f)
+
+    # Swap the new directory in, open maps of the old one stay valid until they're closed.
+    if os.path.exists(master_output_path):
+        os.rename(master_output_path, master_output_path + ".old")
+        os.rename(temp_path, master_output_path)
+        shutil.rmtree(master_output_path + ".old")
+    else:
+        os.rename(temp_path, master_output_path)
+    retire_journal(master_output_path)
+
+
+def open_master_columns(master_input_path: str) -> MasterColumns:
+    """
+    Open a master for column scans. Columnar masters are memory mapped, others (or a columnar
+    master with pending journal records) are loaded and converted.
+    """
+    if master_format(master_input_path) == "columnar" and not os.path.exists(journal_path(master_input_path)):
+        return open_columnar_master(master_input_path)
+    return MasterColumns.from_entries(read_master_file(master_input_path))
+
+
+MASTER_FORMATS = {
+    "pickle": MasterFormat(read_pickle_master, write_pickle_master, update_journaled_master, compact_journaled_master),
+    "sqlite": MasterFormat(
+        read_sqlite_master, write_sqlite_master, update_sqlite_master, compact_sqlite_master, project_sqlite_master
+    ),
+    "columnar": MasterFormat(
+        read_columnar_master,
+        write_columnar_master,
+        update_journaled_master,
+        compact_journaled_master,
+        project_columnar_master,
+    ),
+}
+
+
+def master_format(master_path: str, default: str = "pickle") -> str:
+    """
+    Return the storage format of an existing master file, or default if there isn't one.
+    """
+    if not os.path.exists(master_path):
+        return default
+    if os.path.isdir(master_path):
+        return "columnar"
+    with open(master_path, "rb") as f:
+        header = f.read(len(SQLITE_HEADER))
+    if header == SQLITE_HEADER:
+        return "sqlite"
+    return "pickle"
+
+
+def iter_master_file(master_input_path: str, fields: list[str] = None) -> Iterator[Entries]:
+    """
+    Yield the entries of a master file. Given fields, formats that store columns separately decode
+    only those, leaving the other fields at their defaults, so projected entries must not be saved.
+    """
+    if not os.path.exists(master_input_path):
+        return
+    if fields is None:
+        yield from read_master_file(master_input_path)
+        return
+    if unknown := [field_name for field_name in fields if field_name not in ENTRY_FIELDS]:
+        exit_error(f"Unknown entry fields: {unknown}")
+    storage = MASTER_FORMATS[master_format(master_input_path)]
+    # Pending journal records are whole entries, so replaying them needs a full read.
+    if storage.project is None or os.path.exists(journal_path(master_input_path)):
+        yield from storage.read(master_input_path)
+    else:
+        yield from storage.project(master_input_path, list(fields))
+
+
+def read_master_file(master_input_path: str, verbose: bool = False, fields: list[str] = None) -> list[Entries]:
     master: list[Entries] = []
     if os.path.exists(master_input_path):
-        with open(master_input_path, "rb") as f:
-            master = pickle.load(f)
+        if fields is not None:
+            master = list(iter_master_file(master_input_path, fields))
+        else:
+            master = MASTER_FORMATS[master_format(master_input_path)].read(master_input_path)
+            assign_uids(master)
         if verbose:
             print(f"{len(master)} records found.")
     return master
 
 
+def write_csv_file(master: list[Entries], csv_output_path: str) -> None:
+    with open(csv_output_path, "w") as f:
+        w = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+        w.writerow(
+            [
+                "UID",
+                "Path",
+                "Name",
+                "Ext",
+                "O_Size",
+                "C_Size",
+                "Date",
+                "Backups",
+                "Paths",
+                "O_Duration",
+                "C_Duration",
+                "Ino",
+                "Nlink",
+                "CSum",
+                "Data",
+                "CSumAlgo",
+                "Fingerprint",
+                "FingerprintStamp",
+                "CSumStamp",
+            ]
+        )
+        w.writerows(
+            [
+                item.UID,
+                item.path,
+                item.name,
+                int(item.original_size),
+                int(item.current_size),
+                item.date,
+                int(item.backups),
+                [str(backup_path) for backup_path in item.paths],
+                float(item.original_duration),
+                float(item.current_duration),
+                int(item.ino),
+                int(item.nlink),
+                item.csum,
+                item.data,
+                item.csum_algo,
+                item.fingerprint,
+                item.fingerprint_stamp,
+                item.csum_stamp,
+            ]
+            for item in master
+        )
+
+
 def write_entries_file(
-    master: list[Entries], master_output_path: str, write_csv: bool = True, verbose: bool = False
+    master: list[Entries],
+    master_output_path: str,
+    write_csv: bool = True,
+    verbose: bool = False,
+    storage_format: str = "",
 ) -> None:
-    with open(master_output_path, "wb") as f:
-        pickle.dump(master, f)
+    # Keep the format of an existing file unless told otherwise, new files default to pickle.
+    current_format = master_format(master_output_path)
+    if storage_format == "":
+        storage_format = current_format
+    elif storage_format != current_format and os.path.exists(master_output_path):
+        if os.path.isdir(master_output_path):
+            shutil.rmtree(master_output_path)
+        else:
+            os.remove(master_output_path)
+        if os.path.exists(journal_path(master_output_path)):
+            os.remove(journal_path(master_output_path))
+    # Files are kept in current_size order; write through a view rather than sorting the caller's list.
+    master = sorted_view(master, "current_size").entries()
+    assign_uids(master)
+    MASTER_FORMATS[storage_format].write(master, master_output_path)
 
     if write_csv:
-        csv_output_path = master_output_path + ".csv"
-        with open(csv_output_path, "w") as f:
-            w = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
-            w.writerow(
-                [
-                    "UID",
-                    "Path",
-                    "Name",
-                    "Ext",
-                    "O_Size",
-                    "C_Size",
-                    "Date",
-                    "Backups",
-                    "Paths",
-                    "O_Duration",
-                    "C_Duration",
-                    "Ino",
-                    "Nlink",
-                    "CSum",
-                    "Data",
-                ]
-            )
-            w.writerows(
-                [
-                    item.UID,
-                    item.path,
-                    item.name,
-                    int(item.original_size),
-                    int(item.current_size),
-                    item.date,
-                    int(item.backups),
-                    item.paths,
-                    float(item.original_duration),
-                    float(item.current_duration),
-                    int(item.ino),
-                    int(item.nlink),
-                    item.csum,
-                    item.data,
-                ]
-                for item in master
-            )
+        write_csv_file(master, master_output_path + ".csv")
     print(f"{len(master)} records written.")
 
 
+def update_master_file(
+    master_path: str, updated: list[Entries], deleted: list[str] = [], inserted: list[Entries] = []
+) -> None:
+    """
+    Commit only the updated, deleted (by UID) and inserted entries to an existing master file.
+    """
+    MASTER_FORMATS[master_format(master_path)].update(master_path, updated, deleted, inserted)
+    print(f"{len(inserted)} records inserted, {len(updated)} records updated, {len(deleted)} records deleted.")
+
+
+def compact_master_file(master_path: str) -> None:
+    """
+    Fold any pending updates back into a fresh copy of the master file.
+    """
+    MASTER_FORMATS[master_format(master_path)].compact(master_path)
+
+
+def save_master_changes(
+    master: list[Entries],
+    master_input_path: str,
+    master_output_path: str,
+    updated: list[Entries] = [],
+    deleted: list[Entries] = [],
+    inserted: list[Entries] = [],
+    write_csv: bool = False,
+) -> None:
+    """
+    Save a run's changes: in place as an update when writing back to the input file,
+    otherwise as a full write of master to the new output file.
+    """
+    if master_output_path == master_input_path and os.path.exists(master_output_path):
+        # Deleted entries are already out of master, but their UIDs are still in the file.
+        assign_uids(list(master) + list(deleted), inserted)
+        update_master_file(master_output_path, updated, [entry.UID for entry in deleted], inserted)
+        if write_csv:
+            write_csv_file(sorted_view(master, "current_size").entries(), master_output_path + ".csv")
+    else:
+        write_entries_file(master, master_output_path, write_csv)
+
+
 # Name Search Functions
 
 
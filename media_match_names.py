@@ -41,7 +41,7 @@ def get_args():
     return args
 
 
-def assemble_name_lists(master: list[ml.Entries], ns: ml.NameSearch, args):
+def assemble_name_lists(master: ml.MasterColumns, ns: ml.NameSearch, args):
     """
     Search each entry in master, finding hits against a list of targets.
     Then match that list to a regex, and return the list of indexes to entries that match.
@@ -49,12 +49,12 @@ def assemble_name_lists(master: list[ml.Entries], ns: ml.NameSearch, args):
     name_refs = {}
     unlisted_name_refs = {}
     vendors = {}
-    for i, item in enumerate(master):
-        vendor = ml.get_vendor(item.name)
+    for i, name in enumerate(master.column("name")):
+        vendor = ml.get_vendor(name)
         if vendor not in vendors.keys():
             vendors[vendor] = []
         vendors[vendor].append(i)
-        found_names = ml.search_names(item.name, ns, args)
+        found_names = ml.search_names(name, ns, args)
         for full_name in found_names:
             if full_name.listed == True:
                 if full_name.name not in name_refs.keys():
@@ -73,7 +73,7 @@ def main():
 
     args = get_args()
 
-    if (master := ml.read_master_file(args.master_input_path)) == []:
+    if len(master := ml.open_master_columns(args.master_input_path)) == 0:
         ml.exit_error(f"{args.master_input_path} not found and is required.")
 
     name_search = ml.prepare_name_search(args.first_names_file_input_path, args.full_names_file_input_path)
@@ -1,9 +1,10 @@
 import argparse
+import asyncio
 import os
 from typing import Tuple
 
 import media_library as ml
-from media_library import Entries, SortPointer
+from media_library import Entries
 
 gb_no_action = False
 gb_verbose = False
@@ -31,40 +32,50 @@ def get_args() -> argparse.Namespace:
 
 def find_original(
     master: list[Entries],
-    sorted_pointers: list[SortPointer],
+    by_original_size: ml.SortedView,
     target: Entries,
     orig_size: str,
 ) -> Tuple[bool, int]:
-    found = True
-    start = 0
-    while found:
-        found, fp_index = ml.check_pointers_to_original_size(sorted_pointers, int(orig_size), start)
-        if found and (master[fp_index].name == target.name):
-            return (found, fp_index)
-        start = fp_index
+    for fp_index in by_original_size.equal(int(orig_size)):
+        if master[fp_index].name == target.name:
+            return (True, fp_index)
     return (False, 0)
 
 
-def process_targets(master: list[Entries], sorted_pointers: list[SortPointer], target: list[Entries]) -> list[Entries]:
-
-    for item in target:
-        item_path = os.path.join(item.path, item.name)
-        orig_duration, orig_size = ml.file_md_tag(item_path)
+async def process_targets(
+    master: list[Entries], by_original_size: ml.SortedView, target: list[Entries]
+) -> Tuple[list[Entries], list[Entries]]:
+    media = ml.AsyncMedia()
+    target_paths = [os.path.join(item.path, item.name) for item in target]
+    # Probe and stat the whole batch at once, then hash the ones whose entry has a checksum.
+    probes, stats = await asyncio.gather(
+        asyncio.gather(*(media.quick_probe(item_path) for item_path in target_paths)),
+        asyncio.gather(*(media.stat(item_path) for item_path in target_paths)),
+    )
+    updated = []
+    rehash = []
+    for item, item_path, probe, item_stat in zip(target, target_paths, probes, stats):
+        orig_duration, orig_size = probe.md_tag
         if orig_duration == "":
             ml.exit_error(f"{item_path} has no mp_tag. Cannot detect original file.")
-        found, orig_index = find_original(master, sorted_pointers, item, orig_size)
+        found, orig_index = find_original(master, by_original_size, item, orig_size)
         if found:
             if gb_verbose:
                 print(f"Found original file: {os.path.join(master[orig_index].path, master[orig_index].name)}")
         else:
             ml.exit_error(f"Original entry for {item.name} not found.")
 
-        master[orig_index].current_duration = ml.file_duration(item_path)
-        master[orig_index].current_size = int(os.stat(item_path).st_size)
-        master[orig_index].ino = int(os.stat(item_path).st_ino)
+        master[orig_index].current_duration = probe.duration
+        master[orig_index].current_size = int(item_stat.st_size)
+        master[orig_index].ino = int(item_stat.st_ino)
         if master[orig_index].csum != "":
-            master[orig_index].csum = ml.checksum(item_path)
-    return master
+            master[orig_index].csum_stamp = ml.file_stamp(item_stat)
+            rehash.append((master[orig_index], item_path))
+        updated.append(master[orig_index])
+    csums = await asyncio.gather(*(media.checksum(item_path, entry.csum_algo) for entry, item_path in rehash))
+    for (entry, _), csum in zip(rehash, csums):
+        entry.csum = csum
+    return master, updated
 
 
 def main() -> None:
@@ -91,11 +102,10 @@ def main() -> None:
     else:
         ml.exit_error(f"Target not found: {target_path}")
 
-    master = process_targets(master, ml.pointer_sort_database(master, "original_size"), target)
+    master, updated = asyncio.run(process_targets(master, ml.sorted_view(master, "original_size"), target))
 
     if args.write_file:
-        master.sort(key=lambda x: getattr(x, "current_size"))
-        ml.write_entries_file(master, master_output_path, args.write_csv)
+        ml.save_master_changes(master, master_input_path, master_output_path, updated, write_csv=args.write_csv)
 
 
 if __name__ == "__main__":
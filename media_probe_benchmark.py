@@ -0,0 +1,76 @@
+import argparse
+import os
+import time
+from typing import Tuple
+
+import ffmpeg
+
+import media_library as ml
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare native MP4 probing with ffmpeg.probe.")
+    parser.add_argument("target_path", nargs=1)
+    parser.add_argument("-r", action="store_true", default=False, dest="recursive", help="Recurse into subdirectories.")
+    parser.add_argument("-v", action="store_true", default=False, dest="verbose", help="Verbose.")
+    args = parser.parse_args()
+    return args
+
+
+def time_native(paths: list[str]) -> Tuple[float, dict[str, ml.ProbeResult]]:
+    start = time.perf_counter()
+    results = {path: ml.mp4_probe(path) for path in paths}
+    return time.perf_counter() - start, results
+
+
+def time_ffprobe(paths: list[str]) -> Tuple[float, dict[str, ml.ProbeResult]]:
+    results = {}
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            results[path] = ml.probe_result(ffmpeg.probe(path))
+        except ffmpeg.Error:
+            results[path] = None
+    return time.perf_counter() - start, results
+
+
+def report(name: str, elapsed: float, count: int) -> None:
+    per_file = elapsed / count * 1000 if count else 0
+    print(f"{name:>8}: {elapsed:8.3f}s  {per_file:8.3f} ms/file")
+
+
+def main() -> None:
+    args = get_args()
+    target_path = args.target_path[0]
+    if not os.path.exists(target_path):
+        ml.exit_error(f"{target_path} doesn't exist!")
+    paths = [os.path.join(item.path, item.name) for item in ml.create_file_list(target_path, recursive=args.recursive)]
+    print(f"{len(paths)} target files loaded.")
+
+    native_time, native = time_native(paths)
+    ffprobe_time, probed = time_ffprobe(paths)
+
+    parsed = mismatched = 0
+    for path in paths:
+        if native[path] is None:
+            if args.verbose:
+                print(f"{path}: not parsed, falls back to ffprobe.")
+            continue
+        parsed += 1
+        if probed[path] is None:
+            continue
+        if abs(native[path].duration - probed[path].duration) > 0.05 or native[path].md_tag != probed[path].md_tag:
+            mismatched += 1
+            print(
+                f"{path}: native {native[path].duration} {native[path].md_tag}, "
+                f"ffprobe {probed[path].duration} {probed[path].md_tag}"
+            )
+    report("native", native_time, len(paths))
+    report("ffprobe", ffprobe_time, len(paths))
+    if native_time:
+        print(f"Speedup {ffprobe_time / native_time:.1f}x")
+    print(f"{parsed} parsed natively, {len(paths) - parsed} need ffprobe, {mismatched} mismatched.")
+
+
+if __name__ == "__main__":
+    main()
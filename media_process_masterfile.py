@@ -1,9 +1,6 @@
 import argparse
-import bisect
-import datetime
-import operator
 import os
-from typing import Tuple
+from typing import Optional, Tuple
 
 import media_library as ml
 from media_library import Entries
@@ -15,102 +12,271 @@ NOENTRY = 0
 MASTER = 1
 QUARENTINE = 2
 
+REMOVED = 0
+CHANGED = 1
+
 gb_verbose = False
 
 
 def get_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Create a database of files for the given directory.")
     parser.add_argument("target_paths", nargs="+")
+    parser.add_argument(
+        "-b", type=str, action="append", default=[], dest="backup_paths", help="Backup directory to watch."
+    )
     parser.add_argument("-d", action="store_true", default=False, dest="write_csv", help="Write CSV.")
+    parser.add_argument(
+        "-f", action="store_true", default=False, dest="full_scan", help="Full rescan, ignore the scan cache."
+    )
     parser.add_argument("-i", type=str, dest="master_input_path", default="master_filelist")
     parser.add_argument("-o", type=str, dest="master_output_path", required=False)
+    parser.add_argument("-r", action="store_true", default=False, dest="recursive", help="Scan subdirectories.")
     parser.add_argument("-u", action="store_true", default=False, dest="assign_uid", help="Assign UIDs.")
     parser.add_argument("-v", action="store_true", default=False, dest="verbose", help="Verbose.")
+    parser.add_argument(
+        "--watch", action="store_true", default=False, dest="watch", help="Keep watching and apply changes."
+    )
+    parser.add_argument(
+        "--debounce", type=float, default=5.0, dest="debounce", help="Seconds of quiet before a watch commit."
+    )
     args = parser.parse_args()
     return args
 
 
-def check_current_fs_status(
-    master: list[Entries],
-) -> Tuple[list[Entries], list[Entries]]:
-    """Keep only extant entries, quarentine the others."""
-    quarentine = []
-    for item in master[:]:
-        item_path = os.path.join(item.path, item.name)
-        # Entry no long on the filesystem, quarentine it.
-        if not os.path.exists(item_path):
-            print(f"{item.name} doesn't exist, quarentined.")
-            quarentine.append(item)
-            master.remove(item)
-        # Entry has changed size, bail so user can investigate.
-        elif (size := os.stat(item_path).st_size) != item.current_size:
-            ml.exit_error(f"{item.name} has changed size from {item.current_size} to {size}.")
-    print(f"{len(master)} records loaded.")
-    return (master, quarentine)
-
-
-def build_current_fs_path_list(target_paths: list[str]) -> list[str]:
-    """Return a merged list of files to process."""
-    file_paths = []
-    for target_path in target_paths:
-        print(f"Scanning {target_path}...")
-        files = [
-            os.path.join(target_path, f)
-            for f in os.listdir(target_path)
-            if os.path.isfile(os.path.join(target_path, f)) and os.path.splitext(f)[1] in [".mp4", ".mp4~"]
-        ]
-        print(f"{len(files)} files found.")
-        file_paths.extend(files)
-    print(f"{len(file_paths)} target files loaded.")
-    return file_paths
-
-
-def search_file_path(master: list[Entries], quarentine: list[Entries], file_path: str) -> Tuple[int, int]:
-    """Find the instance of a file in databases if there is one."""
-    fp_stat = os.stat(file_path)
-    found = True
-    start = 0
+def build_current_fs_list(target_paths: list[str], recursive: bool, cache: ml.ScanCache) -> list[Entries]:
+    """Return a merged, size sorted list of the files to process, stat'ed once by the scan."""
+    print(f"Scanning {', '.join(target_paths)}...")
+    scans = ml.scan_roots(target_paths, recursive, cache=cache)
+    for target_path, files in scans.items():
+        print(f"{target_path}: {len(files)} files found.")
+    scanned = list(ml.merge_scans(scans.values()))
+    print(f"{len(scanned)} target files loaded.")
+    return scanned
+
+
+def search_file_path(
+    master: ml.MasterIndex, quarentine: ml.MasterIndex, scanned: Entries
+) -> Tuple[int, Optional[Entries]]:
+    """Find the instance of a scanned file in databases if there is one."""
     # Look in master by size and name, then inode and size.
-    while found:
-        found, fp_index = ml.check_current_size(master, fp_stat.st_size, start)
-        if found and (os.path.join(master[fp_index].path, master[fp_index].name) == file_path):
-            return (MASTER, fp_index)
-        start = fp_index
-    found, fp_index = ml.check_inode_in_path(master, os.path.dirname(file_path), fp_stat.st_ino)
-    if found and (master[fp_index].current_size == fp_stat.st_size):
-        return (MASTER, fp_index)
-    # Look in quarentine by inode and size, then size and mtime.
-    found, fp_index = ml.check_inode_in_path(quarentine, os.path.dirname(file_path), fp_stat.st_ino)
-    if found and (quarentine[fp_index].current_size == fp_stat.st_size):
-        return (QUARENTINE, fp_index)
-    found = True
-    start = 0
-    while found:
-        found, fp_index = ml.check_current_size(quarentine, fp_stat.st_size, start)
-        if found and (
-            quarentine[fp_index].date == datetime.datetime.fromtimestamp(fp_stat.st_mtime, tz=datetime.timezone.utc)
-        ):
-            return (QUARENTINE, fp_index)
-        start = fp_index
-    return (NOENTRY, 0)
-
-
-def process_targets(master: list[Entries], quarentine: list[Entries], target_paths: list[str]) -> list[Entries]:
-    """Main list processing loop."""
-    entry_size = operator.attrgetter("current_size")
-    for file_path in target_paths:
-        found_db, index = search_file_path(master, quarentine, file_path)
+    for entry in master.find_size_name(scanned.current_size, scanned.name):
+        if entry.path == scanned.path:
+            return (MASTER, entry)
+    entry = master.find_path_inode(scanned.path, scanned.ino)
+    if entry is not None and entry.current_size == scanned.current_size:
+        return (MASTER, entry)
+    # Look in quarentine by device and inode (a move or rename anywhere), then size and mtime.
+    entry = quarentine.find_dev_inode(scanned.device, scanned.ino)
+    if entry is not None and entry.current_size == scanned.current_size:
+        return (QUARENTINE, entry)
+    for fp_index in quarentine.sorted_view("current_size").equal(scanned.current_size):
+        if quarentine[fp_index].date == scanned.date:
+            return (QUARENTINE, quarentine[fp_index])
+    return (NOENTRY, None)
+
+
+def report_changes(changes: ml.Changeset) -> None:
+    """Print the changeset, bailing on changed sizes so the user can investigate."""
+    for entry, size in changes.changed:
+        print(f"{os.path.join(entry.path, entry.name)} has changed size from {entry.current_size} to {size}.")
+    if changes.changed:
+        ml.exit_error(f"{len(changes.changed)} files have changed size.")
+    for entry in changes.missing:
+        print(f"{entry.name} doesn't exist, quarentined.")
+    for entry, found in changes.moved + changes.resurrected:
+        print(f"{os.path.join(entry.path, entry.name)} -> {os.path.join(found.path, found.name)} updated")
+    if gb_verbose:
+        for found in changes.added:
+            print(f"{os.path.join(found.path, found.name)} : new")
+
+
+def resurrect_entry(master: ml.MasterIndex, quarentine: ml.MasterIndex, entry: Entries, scanned: Entries) -> None:
+    """Move a quarentined entry back into master, at the scanned file's location."""
+    print(f"{entry.name} -> {os.path.join(scanned.path, scanned.name)} updated")
+    quarentine.remove(entry)
+    entry.path = scanned.path
+    entry.name = scanned.name
+    entry.ino = scanned.ino
+    master.add(entry)
+
+
+def probe_new_entries(scanned: list[Entries]) -> None:
+    """Fill in the durations of newly found files, probing them concurrently."""
+    by_path = {os.path.join(entry.path, entry.name): entry for entry in scanned}
+    for file_path, duration in ml.probe_durations(by_path):
+        by_path[file_path].original_duration = by_path[file_path].current_duration = duration
+
+
+def add_watches(inotify: ml.Inotify, path: str, recursive: bool) -> None:
+    inotify.add_watch(path)
+    if recursive:
+        with os.scandir(path) as it:
+            for dir_entry in it:
+                if dir_entry.is_dir(follow_symlinks=False):
+                    add_watches(inotify, dir_entry.path, recursive)
+
+
+def is_new_link(file_path: str) -> bool:
+    # A new hard link only fires IN_CREATE, a newly written file is picked up at its IN_CLOSE_WRITE.
+    try:
+        return os.stat(file_path).st_nlink > 1
+    except OSError:
+        return False
+
+
+def collect_events(
+    inotify: ml.Inotify, master: ml.MasterIndex, events: list, pending: dict[str, int], recursive: bool
+) -> None:
+    """Fold inotify events into pending, the last change seen per file path."""
+    for directory, mask, name in events:
+        if mask & ml.Inotify.IN_Q_OVERFLOW:
+            print("inotify queue overflowed, events were lost. Run a full rescan.")
+            continue
+        file_path = os.path.join(directory, name)
+        if mask & ml.Inotify.IN_ISDIR:
+            if mask & (ml.Inotify.IN_DELETE | ml.Inotify.IN_MOVED_FROM):
+                for entry in master:
+                    if entry.path == file_path or entry.path.startswith(file_path + os.sep):
+                        pending[os.path.join(entry.path, entry.name)] = REMOVED
+            elif recursive:
+                add_watches(inotify, file_path, recursive)
+                for scanned in ml.scan_files(file_path, recursive=True):
+                    pending[os.path.join(scanned.path, scanned.name)] = CHANGED
+            continue
+        if os.path.splitext(name)[1] not in ml.MEDIA_EXTENSIONS:
+            continue
+        if mask & (ml.Inotify.IN_DELETE | ml.Inotify.IN_MOVED_FROM):
+            pending[file_path] = REMOVED
+        elif mask & (ml.Inotify.IN_CLOSE_WRITE | ml.Inotify.IN_MOVED_TO) or is_new_link(file_path):
+            pending[file_path] = CHANGED
+
+
+def apply_events(
+    master: ml.MasterIndex, quarentine: ml.MasterIndex, pending: dict[str, int]
+) -> Tuple[list[Entries], list[Entries], list[Entries]]:
+    """
+    Apply a batch of library changes: removed files are quarentined first, so that a rename
+    within the batch is found in quarentine by search_file_path. Return updated, deleted, inserted.
+    """
+    updated = []
+    inserted = []
+    for file_path, change in pending.items():
+        directory, name = os.path.split(file_path)
+        if change == REMOVED:
+            for entry in master.find_name(name):
+                if entry.path == directory:
+                    print(f"{file_path} removed, quarentined.")
+                    master.remove(entry)
+                    quarentine.add(entry)
+                    break
+    for file_path, change in pending.items():
+        directory, name = os.path.split(file_path)
+        if change == REMOVED:
+            continue
+        try:
+            scanned = ml.create_file_entry(file_path)
+        except FileNotFoundError:
+            continue
+        found_db, entry = search_file_path(master, quarentine, scanned)
         if gb_verbose:
-            print(f"{file_path} : {found_db} - {index}")
+            print(f"{file_path} : {found_db} - {entry.UID if entry else ''}")
         if found_db == QUARENTINE:
-            print(f"{quarentine[index].name} -> {file_path} updated")
-            quarentine[index].name = os.path.basename(file_path)
-            quarentine[index].ino = os.stat(file_path).st_ino
-            bisect.insort(master, quarentine[index], key=entry_size)
-        if found_db == NOENTRY:
-            new_entry = ml.create_file_entry(file_path, update_duration=True)
-            bisect.insort(master, new_entry, key=entry_size)
-    return master
+            resurrect_entry(master, quarentine, entry, scanned)
+            updated.append(entry)
+        elif found_db == NOENTRY:
+            if any(entry.path == directory for entry in master.find_name(name)):
+                print(f"{file_path} has changed size, skipped.")
+                continue
+            inserted.append(scanned)
+    probe_new_entries(inserted)
+    for scanned in inserted:
+        master.add(scanned)
+    # Whatever is still in quarentine has gone for good.
+    deleted = list(quarentine)
+    for entry in deleted:
+        quarentine.remove(entry)
+    return updated, deleted, inserted
+
+
+def apply_backup_events(master: ml.MasterIndex, pending: dict[str, int]) -> list[Entries]:
+    """
+    Apply a batch of backup directory changes to the backup pointers, the way media_backup_update.py
+    attaches them: a backup file belongs to the one master entry with its name and size.
+    """
+    updated = {}
+    for file_path, change in pending.items():
+        directory, name = os.path.split(file_path)
+        root_id = ml.backup_root_id(directory)
+        # The backup file was removed or replaced, drop the pointers to it.
+        for entry in master.find_name(name):
+            for backup_ref in [ref for ref in entry.paths if isinstance(ref, ml.BackupRef) and ref.root_id == root_id]:
+                entry.paths.remove(backup_ref)
+                entry.backups -= 1
+                updated[id(entry)] = entry
+        if change == REMOVED:
+            continue
+        try:
+            backup_stat = os.stat(file_path)
+        except FileNotFoundError:
+            continue
+        found, result = ml.check_name(master, name, backup_stat.st_size)
+        if found:
+            master[result].paths.append(ml.make_backup_path_entry(directory, backup_stat.st_ino))
+            master[result].backups += 1
+            updated[id(master[result])] = master[result]
+        else:
+            print(f"{file_path} backup not found in master file.")
+    return list(updated.values())
+
+
+def watch(master: list[Entries], args: argparse.Namespace, master_path: str) -> None:
+    """
+    Watch the target and backup directories, committing each batch of changes as an update
+    once no event has arrived for args.debounce seconds.
+    """
+    master_index = ml.MasterIndex(master)
+    quarentine_index = ml.MasterIndex([])
+    inotify = ml.Inotify()
+    for target_path in args.target_paths:
+        add_watches(inotify, target_path, args.recursive)
+    for backup_path in args.backup_paths:
+        inotify.add_watch(backup_path)
+    print(f"Watching {len(inotify.watches)} directories.")
+    pending: dict[str, int] = {}
+    pending_backups: dict[str, int] = {}
+    try:
+        while True:
+            events = inotify.read(args.debounce if pending or pending_backups else None)
+            if events:
+                library_events = [event for event in events if event[0] not in args.backup_paths]
+                backup_events = [event for event in events if event[0] in args.backup_paths]
+                collect_events(inotify, master_index, library_events, pending, args.recursive)
+                collect_events(inotify, master_index, backup_events, pending_backups, False)
+                continue
+            commit_events(master_index, quarentine_index, pending, pending_backups, master_path, args.write_csv)
+    except KeyboardInterrupt:
+        commit_events(master_index, quarentine_index, pending, pending_backups, master_path, args.write_csv)
+    finally:
+        inotify.close()
+
+
+def commit_events(
+    master: ml.MasterIndex,
+    quarentine: ml.MasterIndex,
+    pending: dict[str, int],
+    pending_backups: dict[str, int],
+    master_path: str,
+    write_csv: bool,
+) -> None:
+    if not pending and not pending_backups:
+        return
+    updated, deleted, inserted = apply_events(master, quarentine, pending)
+    updated_ids = {id(entry) for entry in updated}
+    updated += [entry for entry in apply_backup_events(master, pending_backups) if id(entry) not in updated_ids]
+    pending.clear()
+    pending_backups.clear()
+    if updated or deleted or inserted:
+        ml.save_master_changes(master.master, master_path, master_path, updated, deleted, inserted, write_csv)
 
 
 def main() -> None:
@@ -124,16 +290,31 @@ def main() -> None:
 
     gb_verbose = args.verbose
 
+    cache = ml.ScanCache("" if args.full_scan else ml.scan_cache_path(args.master_input_path))
     if (master := ml.read_master_file(args.master_input_path)) != []:
-        master.sort(key=lambda x: getattr(x, "current_size"))
-        master, quarentine = check_current_fs_status(master)
-    target_paths = build_current_fs_path_list(args.target_paths)
-    master = process_targets(master, quarentine, target_paths)
+        print(f"{len(master)} records loaded.")
+    targets = build_current_fs_list(args.target_paths, args.recursive, cache)
+    changes = ml.reconcile_master(master, targets, args.target_paths, cache.stat)
+    report_changes(changes)
+    probe_new_entries(changes.added)
+    master = ml.apply_changeset(master, changes)
     if args.assign_uid:
         for i, _ in enumerate(master):
             master[i].UID = f"{i:06d}"
-
-    ml.write_entries_file(master, master_output_path, args.write_csv)
+        ml.write_entries_file(master, master_output_path, args.write_csv)
+    else:
+        ml.save_master_changes(
+            master,
+            args.master_input_path,
+            master_output_path,
+            updated=[entry for entry, _ in changes.moved + changes.resurrected],
+            deleted=changes.missing,
+            inserted=changes.added,
+            write_csv=args.write_csv,
+        )
+    cache.save(ml.scan_cache_path(master_output_path))
+    if args.watch:
+        watch(master, args, master_output_path)
 
 
 if __name__ == "__main__":
@@ -43,7 +43,7 @@ def main() -> None:
         backup_path = backup_path + "/"
     backup_path = backup_path + "Spank"
 
-    changed = False
+    changed = set()
 
     if (master := ml.read_master_file(args.master_input_path)) == []:
         ml.exit_error(f"{args.master_input_path} not found and is required.")
@@ -59,11 +59,16 @@ def main() -> None:
                     target_stat = os.stat(target_path)
                     target_entry = ml.make_backup_path_entry(path, target_stat.st_ino)
                     master[i].paths[j] = target_entry
-                    changed = True
+                    changed.add(i)
 
     if changed and args.write_file:
-        master.sort(key=lambda x: getattr(x, "current_size"))
-        ml.write_entries_file(master, master_output_path, args.write_csv)
+        ml.save_master_changes(
+            master,
+            args.master_input_path,
+            master_output_path,
+            [master[i] for i in sorted(changed)],
+            write_csv=args.write_csv,
+        )
 
 
 if __name__ == "__main__":
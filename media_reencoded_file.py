@@ -4,7 +4,7 @@ import datetime as dt
 import os
 
 import media_library as ml
-from media_library import Entries, SortPointer
+from media_library import Entries
 
 gb_no_action = False
 gb_verbose = False
@@ -76,52 +76,55 @@ def replace_backups(item: Entries) -> Entries:
 
 
 def process_targets(
-    master: list[Entries],
-    sorted_pointers: list[SortPointer],
+    master: ml.MasterIndex,
     target: list[Entries],
     original_dir: str,
     replace_backup_files: bool,
 ) -> list[Entries]:
+    updated = []
     for item in target:
         item_path = os.path.join(item.path, item.name)
-        found, orig_index = ml.check_pointers_to_name(sorted_pointers, item.name)
+        found, orig_index = ml.check_name(master, item.name)
         if found:
             if gb_verbose:
                 print(f"Found original file: {os.path.join(master[orig_index].path, master[orig_index].name)}")
         else:
-            ml.exit_error(f"Original entry for {item.name} not found.")
+            ml.exit_error(f"No unique original entry for {item.name}.")
+        entry = master[orig_index]
 
-        master_path = os.path.join(master[orig_index].path, item.name)
+        master_path = os.path.join(entry.path, item.name)
 
         ml.move_file(master_path, original_dir, gb_verbose, gb_no_action)
         ml.move_file(item_path, master_path, gb_verbose, gb_no_action)
         os.utime(
             master_path,
             (
-                dt.datetime.timestamp(master[orig_index].date),
-                dt.datetime.timestamp(master[orig_index].date),
+                dt.datetime.timestamp(entry.date),
+                dt.datetime.timestamp(entry.date),
             ),
         )
 
         master_stat = os.stat(master_path)
 
-        if master[orig_index].original_size == master[orig_index].current_size:
-            master[orig_index].original_size = int(master_stat.st_size)
-            master[orig_index].current_size = int(master_stat.st_size)
-        else:
-            master[orig_index].current_size = int(master_stat.st_size)
-        if master[orig_index].original_duration == master[orig_index].current_duration:
-            master[orig_index].original_duration = float(ml.file_duration(master_path))
-            master[orig_index].current_duration = master[orig_index].original_duration
-        else:
-            master[orig_index].current_duration = float(ml.file_duration(master_path))
-        master[orig_index].ino = int(master_stat.st_ino)
-        if master[orig_index].csum != "":
-            master[orig_index].csum = ml.checksum(master_path)
+        changes = {"current_size": int(master_stat.st_size), "ino": int(master_stat.st_ino)}
+        if entry.original_size == entry.current_size:
+            changes["original_size"] = changes["current_size"]
+        changes["current_duration"] = ml.file_duration(master_path)
+        if entry.original_duration == entry.current_duration:
+            changes["original_duration"] = changes["current_duration"]
+        if entry.csum != "":
+            changes["csum"] = ml.file_checksum(master_path, entry.csum_algo)
+            changes["csum_stamp"] = ml.file_stamp(master_stat)
+        master.update(entry, **changes)
 
         if replace_backup_files:
-            master[orig_index] = replace_backups(master[orig_index])
-    return master
+            new_entry = replace_backups(entry)
+            if new_entry is not entry:
+                master.remove(entry)
+                master.add(new_entry)
+                entry = new_entry
+        updated.append(entry)
+    return updated
 
 
 def main() -> None:
@@ -148,17 +151,15 @@ def main() -> None:
     else:
         ml.exit_error(f"Target not found: {target_path}")
 
-    master = process_targets(
-        master,
-        ml.pointer_sort_database(master, "name"),
+    updated = process_targets(
+        ml.MasterIndex(master),
         target,
         args.original_dir,
         args.replace_backup_files,
     )
 
     if args.write_file:
-        master.sort(key=lambda x: getattr(x, "current_size"))
-        ml.write_entries_file(master, master_output_path, args.write_csv)
+        ml.save_master_changes(master, master_input_path, master_output_path, updated, write_csv=args.write_csv)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,10 @@
 import argparse
+import asyncio
 import os
 from typing import Tuple
 
 import media_library as ml
-from media_library import Entries, SortPointer
+from media_library import Entries
 
 gb_no_action = False
 gb_verbose = False
@@ -29,21 +30,37 @@ def get_args() -> argparse.Namespace:
     return args
 
 
-def find_original(master: list[Entries], sorted_pointers: list[SortPointer], target: Entries) -> Tuple[bool, int]:
-    found = True
-    start = 0
-    while found:
-        found, fp_index = ml.check_pointers_to_original_size(sorted_pointers, target.original_size, start)
-        if found and (master[fp_index].name == target.name):
-            return (found, fp_index)
-        start = fp_index
+def find_original(master: list[Entries], by_original_size: ml.SortedView, target: Entries) -> Tuple[bool, int]:
+    for fp_index in by_original_size.equal(target.original_size):
+        if master[fp_index].name == target.name:
+            return (True, fp_index)
     return (False, 0)
 
 
-def process_targets(master: list[Entries], sorted_pointers: list[SortPointer], target: list[Entries]) -> list[Entries]:
+async def restore_entry(media: ml.AsyncMedia, item_path: str, entry: Entries) -> None:
+    curr_file_path = os.path.join(entry.path, entry.name)
+    if gb_verbose:
+        print(f"Copying backup file {item_path} to {entry.path}")
+    if not gb_no_action:
+        await media.copy_file(item_path, curr_file_path, gb_verbose, gb_no_action)
+
+    duration, curr_stat = await asyncio.gather(media.file_duration(curr_file_path), media.stat(curr_file_path))
+    entry.current_duration = duration
+    entry.current_size = int(curr_stat.st_size)
+    entry.ino = int(curr_stat.st_ino)
+    if entry.csum != "":
+        entry.csum = await media.checksum(curr_file_path, entry.csum_algo)
+        entry.csum_stamp = ml.file_stamp(curr_stat)
+
+
+async def process_targets(
+    master: list[Entries], by_original_size: ml.SortedView, target: list[Entries]
+) -> Tuple[list[Entries], list[Entries]]:
+    updated = []
+    restores = []
     for item in target:
         item_path = os.path.join(item.path, item.name)
-        found, orig_index = find_original(master, sorted_pointers, item)
+        found, orig_index = find_original(master, by_original_size, item)
         if found:
             if gb_verbose:
                 print(f"Found original entry - {orig_index}: {master[orig_index].name}")
@@ -65,17 +82,12 @@ def process_targets(master: list[Entries], sorted_pointers: list[SortPointer], t
                     gb_verbose,
                     gb_no_action,
                 )
-        if gb_verbose:
-            print(f"Copying backup file {item_path} to {master[orig_index].path}")
-        if not gb_no_action:
-            ml.copy_file(item_path, curr_file_path, gb_verbose, gb_no_action)
-
-        master[orig_index].current_duration = ml.file_duration(curr_file_path)
-        master[orig_index].current_size = int(os.stat(curr_file_path).st_size)
-        master[orig_index].ino = int(os.stat(curr_file_path).st_ino)
-        if master[orig_index].csum != "":
-            master[orig_index].csum = ml.checksum(curr_file_path)
-    return master
+        restores.append((item_path, master[orig_index]))
+        updated.append(master[orig_index])
+    # Copy, probe, stat and hash the restored files together.
+    media = ml.AsyncMedia()
+    await asyncio.gather(*(restore_entry(media, item_path, entry) for item_path, entry in restores))
+    return master, updated
 
 
 def main() -> None:
@@ -102,11 +114,10 @@ def main() -> None:
     else:
         ml.exit_error(f"Target not found: {target_path}")
 
-    master = process_targets(master, ml.pointer_sort_database(master, "original_size"), target)
+    master, updated = asyncio.run(process_targets(master, ml.sorted_view(master, "original_size"), target))
 
     if args.write_file:
-        master.sort(key=lambda x: getattr(x, "current_size"))
-        ml.write_entries_file(master, master_output_path, args.write_csv)
+        ml.save_master_changes(master, master_input_path, master_output_path, updated, write_csv=args.write_csv)
 
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ import re
 import time
 
 import ahocorasick_rs as ah
+import numpy as np
 
 import media_library as ml
 
@@ -69,11 +70,11 @@ def search_strings(master, args):
     else:
         ah_search = ah.AhoCorasick(targets)
     file_indexes = []
-    for i, item in enumerate(master):
+    for i, name in enumerate(master.column("name")):
         if args.case_insensitive:
-            results = ah_search.find_matches_as_indexes(item.name.upper())
+            results = ah_search.find_matches_as_indexes(name.upper())
         else:
-            results = ah_search.find_matches_as_indexes(item.name)
+            results = ah_search.find_matches_as_indexes(name)
         if results != []:
             results.sort(key=lambda x: x[0])
             tokens = "".join([str(x) for x in (list(zip(*results))[0])])
@@ -85,14 +86,15 @@ def search_strings(master, args):
 def main():
     args = get_args()
 
-    if (master := ml.read_master_file(args.master_input_path)) == []:
+    if len(master := ml.open_master_columns(args.master_input_path)) == 0:
         ml.exit_error(f"{args.master_input_path} not found and is required.")
 
     results = search_strings(master, args)
-    entries = [master[res] for res in results]
     if args.sort_time:
-        entries.sort(key=lambda x: float(x.original_duration))
-    else:
+        sort_order = master.argsort("original_duration")
+        results = sort_order[np.isin(sort_order, results)]
+    entries = [master[res] for res in results]
+    if not args.sort_time:
         entries.sort(key=lambda x: x.name)
     if args.print_path:
         for ent in entries:
@@ -1,7 +1,5 @@
 import argparse
-import bisect
 import getch
-import operator
 import os
 
 import media_library as ml
@@ -28,29 +26,6 @@ def get_reply(question: str) -> bool:
                 return False
 
 
-def check_master_files(master: list[ml.Entries], curr: ml.Entries) -> int:
-    entry_size = operator.attrgetter("current_size")
-
-    result = bisect.bisect_left(master, curr.current_size, key=entry_size)
-    while True:
-        if result == len(master) or master[result].current_size != curr.current_size:
-            return -1
-        if master[result].name == curr.name:
-            return result
-        result += 1
-
-
-def get_entries_by_duration(master: list[ml.Entries], duration: float) -> list[ml.Entries]:
-
-    entry_list = []
-    rdur = round(duration, 1)
-
-    for entry in master:
-        if rdur - 0.2 < round(entry.current_duration, 1) < rdur + 0.2:
-            entry_list.append(entry)
-    return entry_list
-
-
 def main() -> None:
 
     args = get_args()
@@ -72,21 +47,21 @@ def main() -> None:
     else:
         ml.exit_error(f"{backup_path} doesn't exist!")
 
+    master_index = ml.MasterIndex(master)
+    orphans = [item for item in working if not master_index.find_size_name(item.current_size, item.name)]
+    probed = dict(ml.probe_durations(os.path.join(item.path, item.name) for item in orphans))
+    durations = [probed[os.path.join(item.path, item.name)] for item in orphans]
     unlink_count = 0
-    for item in working:
-        result = check_master_files(master, item)
-        if result == -1:
-            backup_duration = ml.file_duration(os.path.join(item.path, item.name))
-            matches = get_entries_by_duration(master, backup_duration)
-            print(f"{item.name} - {round(backup_duration, 1)}")
-            if matches == []:
-                print("No matches found.")
-            else:
-                for entry in matches:
-                    print(f"    {entry.name} - {round(entry.current_duration, 1)}")
-            if get_reply("Delete backup file?"):
-                os.unlink(os.path.join(item.path, item.name))
-                unlink_count += 1
+    for item, backup_duration, matches in zip(orphans, durations, master_index.find_by_durations(durations, 0.2)):
+        print(f"{item.name} - {round(backup_duration, 1)}")
+        if matches == []:
+            print("No matches found.")
+        else:
+            for entry in matches:
+                print(f"    {entry.name} - {round(entry.current_duration, 1)}")
+        if get_reply("Delete backup file?"):
+            os.unlink(os.path.join(item.path, item.name))
+            unlink_count += 1
 
     print(f"{unlink_count} files unlinked.")
 
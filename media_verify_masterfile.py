@@ -76,7 +76,7 @@ def get_reply(question: str) -> bool:
                 return False
 
 
-def normalize_paths(paths: list[str]) -> list[str]:
+def normalize_paths(paths: list[ml.BackupRef]) -> list[ml.BackupRef]:
     normpath = []
     for whole_path in paths[:]:
         path, inode = ml.split_backup_path(whole_path)
@@ -91,7 +91,7 @@ def main() -> None:
     else:
         master_output_path = args.master_input_path
 
-    changed = False
+    changed = set()
 
     if (master := ml.read_master_file(args.master_input_path)) != []:
 
@@ -100,43 +100,45 @@ def main() -> None:
                 try:
                     if not isinstance(master[i].UID, str):
                         master[i].UID = str(master[i].UID)
-                        changed = True
+                        changed.add(i)
                     if not isinstance(master[i].path, str):
                         master[i].path = str(master[i].path)
-                        changed = True
+                        changed.add(i)
                     if not isinstance(master[i].name, str):
                         master[i].name = str(master[i].name)
-                        changed = True
+                        changed.add(i)
                     if not isinstance(master[i].original_size, int):
                         master[i].original_size = int(master[i].original_size)
-                        changed = True
+                        changed.add(i)
                     if not isinstance(master[i].current_size, int):
                         master[i].current_size = int(master[i].current_size)
-                        changed = True
+                        changed.add(i)
                     if not isinstance(master[i].backups, int):
                         master[i].backups = int(master[i].backups)
-                        changed = True
+                        changed.add(i)
                     if not isinstance(master[i].original_duration, float):
                         master[i].original_duration = float(master[i].original_duration)
-                        changed = True
+                        changed.add(i)
                     if not isinstance(master[i].current_duration, float):
                         master[i].current_duration = float(master[i].current_duration)
-                        changed = True
+                        changed.add(i)
                     if not isinstance(master[i].ino, int):
                         master[i].ino = int(master[i].ino)
-                        changed = True
+                        changed.add(i)
                     if not isinstance(master[i].nlink, int):
                         master[i].nlink = int(master[i].nlink)
-                        changed = True
+                        changed.add(i)
                     if not isinstance(master[i].csum, str):
                         master[i].csum = str(master[i].csum)
-                        changed = True
+                        changed.add(i)
                 except (ValueError, TypeError) as e:
                     ml.exit_error(e)
                 if not isinstance(master[i].date, datetime.datetime):
                     ml.exit_error(f"{master[i].name} date field is invalid: {master[i].date}")
                 if not isinstance(master[i].data, dict):
                     ml.exit_error(f"{master[i].name} data field is invalid: {master[i].data}")
+                if master[i].csum_algo not in ml.CHECKSUM_ALGORITHMS:
+                    ml.exit_error(f"{master[i].name} csum_algo field is invalid: {master[i].csum_algo}")
 
         # Create a list of inodes, and check that there are no duplicates (multiple entries pointing to one file).
         inodes = sorted([(i, item.ino) for i, item in enumerate(master)], key=lambda x: x[1])
@@ -163,7 +165,7 @@ def main() -> None:
                 if args.fix_errors:
                     if args.answer_yes or get_reply("Fix this error?"):
                         master[i].ino = target_stat.st_ino
-                        changed = True
+                        changed.add(i)
                 continue
             # Entry size doesn't match, flag it.
             if target_stat.st_size != item.current_size:
@@ -172,19 +174,19 @@ def main() -> None:
 
             if (normal_paths := normalize_paths(item.paths)) != item.paths:
                 paths = list(set(normal_paths))
-                print(f"Paths corrected: {item.paths} -> {paths}")
+                print(f"Paths corrected: {item.paths} -> {[str(path) for path in paths]}")
                 master[i].paths = paths
                 master[i].backups = len(paths)
                 item.paths = paths
                 item.backups = len(paths)
-                changed = True
+                changed.add(i)
 
             if len(item.paths) != item.backups:
                 print(f"{target_path} backup count {item.backups} does not match path list length {len(item.paths)}.")
                 if args.fix_errors:
                     if args.answer_yes or get_reply("Fix this error?"):
                         master[i].backups = len(item.paths)
-                        changed = True
+                        changed.add(i)
 
             for j, whole_path in enumerate(item.paths[:]):
                 if item.paths.count(whole_path) > 1:
@@ -193,7 +195,7 @@ def main() -> None:
                         if args.answer_yes or get_reply("Fix this error?"):
                             del master[i].paths[j]
                             master[i].backups -= 1
-                            changed = True
+                            changed.add(i)
                 else:
                     path, inode = ml.split_backup_path(whole_path)
                     backup_path = os.path.join(path, item.name)
@@ -205,8 +207,8 @@ def main() -> None:
                                 print(f"{backup_path} backup inode {backup_stat.st_ino} doesn't match entry {inode}.")
                                 if args.fix_errors:
                                     if args.answer_yes or get_reply("Fix this error?"):
-                                        master[i].paths[j] = f"{path}/[{backup_stat.st_ino}]"
-                                        changed = True
+                                        master[i].paths[j] = ml.make_backup_path_entry(path, backup_stat.st_ino)
+                                        changed.add(i)
                                 continue
                             # Backup size doesn't match.
                             if backup_stat.st_size != item.original_size:
@@ -219,7 +221,7 @@ def main() -> None:
                             if args.fix_errors:
                                 master[i].paths.remove(whole_path)
                                 master[i].backups -= 1
-                                changed = True
+                                changed.add(i)
                             continue
             if master[i].backups < 1 and len(master[i].paths) < 1:
                 if not args.suppress_backup_warning:
@@ -233,13 +235,18 @@ def main() -> None:
                     print(f"{master[i].data}")
 
         if args.clear_data:
-            for item in master:
+            for i, item in enumerate(master):
                 item.data = {}
-            changed = True
+                changed.add(i)
 
         if changed and args.write_file:
-            master.sort(key=lambda x: getattr(x, "current_size"))
-            ml.write_entries_file(master, master_output_path, args.write_csv)
+            ml.save_master_changes(
+                master,
+                args.master_input_path,
+                master_output_path,
+                [master[i] for i in sorted(changed)],
+                write_csv=args.write_csv,
+            )
 
 
 if __name__ == "__main__":